@@ -5,35 +5,280 @@ Flask web server for EEG pattern classification using 2D DWT
 Based on 2013 Brain Mapping using MATLAB Technology project
 """
 
+import io
 import os
 import json
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import logging.config
+import threading
+import tarfile
+import zipfile
+import zlib
+from flask import Flask, Request, Response, render_template, request, jsonify, send_from_directory, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from eeg_processor import EEGProcessor
 from signal_generator import EEGSignalGenerator
+from result_cache import RenderCache, ResultCache
+from jobs import JobManager
+from profiling import NULL_PROFILER, StageProfiler
 import tempfile
 import shutil
 
+class InMemoryRequest(Request):
+    """Request that keeps single uploads in memory instead of spooling them to disk"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Batch bodies may be far larger than one image; werkzeug spools them
+        # to a temporary file so concurrent batches do not pile up in RAM
+        if self.endpoint == 'upload_batch':
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Bounded by MAX_CONTENT_LENGTH, so single uploads never hit the filesystem
+        return io.BytesIO()
+    
+    @property
+    def max_content_length(self):
+        # Batch uploads carry a whole study, so they get a larger limit
+        if self.endpoint == 'upload_batch':
+            return app.config['MAX_BATCH_CONTENT_LENGTH']
+        return super().max_content_length
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_BATCH_CONTENT_LENGTH'] = 256 * 1024 * 1024  # 256MB max batch upload
+
+# Opt-in per-stage timings in responses and the 'brainmapping' log
+app.config['PROFILE_REQUESTS'] = os.environ.get('BRAINMAPPING_PROFILE', '') == '1'
+app.config['PROFILE_ALLOCATIONS'] = os.environ.get('BRAINMAPPING_PROFILE_ALLOCATIONS', '') == '1'
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+# Corrupt or truncated archives (gzip and deflate failures surface as OSError, EOFError or zlib.error)
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, OSError)
+INVALID_TYPE_ERROR = 'Invalid file type. Please upload PNG, JPG, JPEG, or BMP files.'
+BATCH_CHUNK_SIZE = 64
+DATA_DIR = 'data'
 REFERENCE_DIR = 'data/reference_signals'
 TEST_SAMPLES_DIR = 'data/test_samples'
+CACHE_DIR = 'data/cache'
+VISUALIZATION_CACHE_DIR = os.path.join(UPLOAD_FOLDER, 'viz_cache')
+VISUALIZATION_RENDERER = 'fast'  # 'fast' (PIL tiles) or 'matplotlib'
+LOGGING_CONFIG = 'logging.conf'
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Initialize EEG processor
-processor = EEGProcessor()
+processor = EEGProcessor(cache_dir=CACHE_DIR)
+
+# Cache of classification results for repeated images
+result_cache = ResultCache(max_entries=256, ttl_seconds=600)
+
+# Decompositions computed during classification, reused by /visualize;
+# they do not depend on the reference set so they are never synced
+decomposition_cache = ResultCache(max_entries=32, ttl_seconds=600)
+
+# Rendered visualizations, addressed by source content
+render_cache = RenderCache(VISUALIZATION_CACHE_DIR, max_bytes=64 * 1024 * 1024)
+
+# Worker pool for long-running jobs (dataset generation, bulk classification)
+job_manager = JobManager(max_workers=2)
+
+# Dataset generation rewrites the data directory, so only one runs at a time
+generation_lock = threading.Lock()
+
+def configure_logging(config_path=LOGGING_CONFIG):
+    """
+    Route the 'brainmapping' logger (request timings) as logging.conf describes
+    
+    Runs at import so WSGI servers such as gunicorn get the same logging as
+    the development server. A host that already attached handlers to the
+    'brainmapping' logger is left alone.
+    """
+    if logging.getLogger('brainmapping').handlers or not os.path.exists(config_path):
+        return
+    os.makedirs('logs', exist_ok=True)
+    logging.config.fileConfig(config_path, disable_existing_loggers=False)
+
+configure_logging()
 
 def allowed_file(filename):
     """Check if uploaded file has allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def iter_archive(filename, stream):
+    """
+    Yield (name, image bytes, error) for each file in a zip or tar archive
+    
+    Unsupported members get an error instead of bytes. A corrupt archive
+    ends with one error entry named after the archive; members read before
+    the damage are still yielded.
+    """
+    try:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(stream) as archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    if not allowed_file(member.filename) or member.file_size > app.config['MAX_CONTENT_LENGTH']:
+                        yield member.filename, None, INVALID_TYPE_ERROR
+                    else:
+                        yield member.filename, archive.read(member), None
+        else:
+            with tarfile.open(fileobj=stream, mode='r:*') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    if not allowed_file(member.name) or member.size > app.config['MAX_CONTENT_LENGTH']:
+                        yield member.name, None, INVALID_TYPE_ERROR
+                    else:
+                        yield member.name, archive.extractfile(member).read(), None
+    except ARCHIVE_ERRORS as e:
+        yield filename, None, f'Invalid archive: {str(e)}'
+
+def iter_batch_uploads(files):
+    """Yield (name, image bytes, error) for uploaded images, expanding archives"""
+    for file in files:
+        if file.filename.lower().endswith(ARCHIVE_EXTENSIONS):
+            yield from iter_archive(file.filename, file.stream)
+        elif allowed_file(file.filename):
+            yield secure_filename(file.filename), file.stream.read(), None
+        else:
+            yield file.filename, None, INVALID_TYPE_ERROR
+
+def start_profile(name):
+    """Profiler for one request, or a no-op one unless PROFILE_REQUESTS is set"""
+    if not app.config['PROFILE_REQUESTS']:
+        return NULL_PROFILER
+    return StageProfiler(name, app.config['PROFILE_ALLOCATIONS'])
+
+def profiled_response(results, profiler):
+    """
+    Encode results as JSON, adding the request's timings when profiling
+    
+    The timings block in the body covers every stage before encoding; the
+    logged profile and the Server-Timing header also include json_encode.
+    """
+    if profiler is NULL_PROFILER:
+        return jsonify(results)
+    
+    results['timings'] = profiler.report()
+    with profiler.stage('json_encode'):
+        response = jsonify(results)
+    report = profiler.finish(path=request.path)
+    response.headers['Server-Timing'] = ', '.join(
+        f"{name};dur={entry['ms']:.2f}" for name, entry in report['stages'].items())
+    return response
+
+def classify_stream(uploads, chunk_size=BATCH_CHUNK_SIZE, profiler=NULL_PROFILER):
+    """
+    Classify (name, image bytes, error) entries in chunks, yielding one result per file
+    
+    Cached results are reused; the rest of each chunk is scored with a
+    single classify_batch call.
+    """
+    result_cache.sync(processor.reference_version)
+    chunk = []
+    
+    def flush():
+        with profiler.stage('cache_lookup'):
+            keys = [ResultCache.key(image_bytes, processor) for _, _, image_bytes in chunk]
+            results = [result_cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            batch = processor.classify_batch([chunk[i][2] for i in misses], batch_size=chunk_size,
+                                             profiler=profiler)
+            for i, result in zip(misses, batch):
+                if 'error' not in result:
+                    result_cache.put(keys[i], result)
+                results[i] = dict(result)
+        for (index, name, _), result in zip(chunk, results):
+            result.update(index=index, filename=name)
+            if 'error' not in result:
+                result['test_image'] = name
+            yield result
+        chunk.clear()
+    
+    for index, (name, image_bytes, error) in enumerate(uploads):
+        if error is not None:
+            yield {'index': index, 'filename': name, 'error': error}
+            continue
+        chunk.append((index, name, image_bytes))
+        if len(chunk) == chunk_size:
+            yield from flush()
+    if chunk:
+        yield from flush()
+
+def classify_cached(image_bytes, profiler=NULL_PROFILER):
+    """Classify encoded image bytes, reusing the result for identical content"""
+    with profiler.stage('cache_lookup'):
+        # Results computed against a replaced reference set are dropped
+        result_cache.sync(processor.reference_version)
+        
+        content_key = ResultCache.content_key(image_bytes, processor)
+        key = ResultCache.key(image_bytes, processor, content_key=content_key)
+        results = result_cache.get(key)
+    if results is None:
+        with profiler.stage('decode'):
+            image = processor.load_image(image_bytes)
+        if image is None:
+            return {"error": "Failed to load test image"}
+        
+        with profiler.stage('dwt'):
+            decomposition = processor.decompose(image)
+        results = processor.classify_image(image, decomposition=decomposition, profiler=profiler)
+        if 'error' not in results:
+            result_cache.put(key, results)
+            decomposition_cache.put(content_key, {'image': image, 'decomposition': decomposition})
+    return results
+
+def generate_dataset_and_reload():
+    """Generate the synthetic dataset and reload the reference database"""
+    with generation_lock:
+        generator = EEGSignalGenerator()
+        generator.generate_dataset(DATA_DIR)
+        
+        # Reload reference database; requests in flight keep the previous set
+        processor.load_reference_database(REFERENCE_DIR)
+    
+    return {
+        'message': 'Dataset generated successfully',
+        'reference_count': len(processor.reference_transforms)
+    }
+
+def resolve_data_directory(directory):
+    """Resolve a directory relative to DATA_DIR, or None if it lies outside it"""
+    root = os.path.realpath(DATA_DIR)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        return None
+    return path
+
+def classify_directory(job, directory, batch_size=64):
+    """Classify every image in a directory, reporting progress per batch"""
+    filenames = sorted(f for f in os.listdir(directory) if allowed_file(f))
+    processor.ensure_reference_database(REFERENCE_DIR)
+    
+    results = []
+    job.report_progress(0, len(filenames))
+    for start in range(0, len(filenames), batch_size):
+        chunk = filenames[start:start + batch_size]
+        batch = processor.classify_batch([os.path.join(directory, f) for f in chunk], batch_size=batch_size)
+        for filename, result in zip(chunk, batch):
+            result['filename'] = filename
+            results.append(result)
+        job.report_progress(len(results), len(filenames))
+    
+    return {
+        'directory': os.path.relpath(directory, os.path.realpath(DATA_DIR)),
+        'image_count': len(results),
+        'abnormal_count': sum(r.get('classification') == 'Abnormal' for r in results),
+        'results': results
+    }
+
 @app.route('/')
 def index():
     """Main page"""
@@ -59,32 +304,66 @@ def upload_file():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
-            # Save uploaded file
             filename = secure_filename(file.filename)
-            temp_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(temp_path)
             
-            # Load reference database if not already loaded
-            if not processor.reference_transforms:
-                processor.load_reference_database(REFERENCE_DIR)
+            profiler = start_profile('upload')
             
-            # Classify the uploaded image
-            results = processor.classify_eeg_pattern(temp_path)
+            # Load reference database if not already loaded (once, even under concurrent requests)
+            with profiler.stage('load_references'):
+                processor.ensure_reference_database(REFERENCE_DIR)
             
-            # Add image path for frontend display
-            results['uploaded_filename'] = filename
+            # Classify the uploaded image straight from the request stream
+            with profiler.stage('read_upload'):
+                image_bytes = file.stream.read()
+            results = classify_cached(image_bytes, profiler)
             
-            # Clean up uploaded file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # Add image name for frontend display
+            if 'error' not in results:
+                results['test_image'] = filename
+            results['uploaded_filename'] = filename
             
-            return jsonify(results)
+            return profiled_response(results, profiler)
         else:
-            return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, JPEG, or BMP files.'}), 400
+            return jsonify({'error': INVALID_TYPE_ERROR}), 400
             
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({'error': f'Processing error: {str(e)}'}), 500
 
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """Classify many uploaded images, or zip/tar archives of images, streaming NDJSON results"""
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    try:
+        # Load reference database if not already loaded (once, even under concurrent requests)
+        processor.ensure_reference_database(REFERENCE_DIR)
+    except Exception as e:
+        return jsonify({'error': f'Processing error: {str(e)}'}), 500
+    
+    profiler = start_profile('upload_batch')
+    
+    def generate():
+        counts = {'classified': 0, 'abnormal': 0, 'errors': 0}
+        for result in classify_stream(iter_batch_uploads(files), profiler=profiler):
+            if 'error' in result:
+                counts['errors'] += 1
+            else:
+                counts['classified'] += 1
+                counts['abnormal'] += result['classification'] == 'Abnormal'
+            yield json.dumps(result) + '\n'
+        
+        # The last line summarizes the whole batch
+        summary = {'summary': counts}
+        if profiler is not NULL_PROFILER:
+            summary['timings'] = profiler.finish(path=request.path, **counts)
+        yield json.dumps(summary) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/test_sample/<filename>')
 def test_sample(filename):
     """Process a test sample from the demo data"""
@@ -94,16 +373,23 @@ def test_sample(filename):
         if not os.path.exists(sample_path):
             return jsonify({'error': 'Test sample not found'}), 404
         
-        # Load reference database if not already loaded
-        if not processor.reference_transforms:
-            processor.load_reference_database(REFERENCE_DIR)
+        profiler = start_profile('test_sample')
+        
+        # Load reference database if not already loaded (once, even under concurrent requests)
+        with profiler.stage('load_references'):
+            processor.ensure_reference_database(REFERENCE_DIR)
         
         # Classify the test sample
-        results = processor.classify_eeg_pattern(sample_path)
+        with profiler.stage('read_sample'):
+            with open(sample_path, 'rb') as f:
+                image_bytes = f.read()
+        results = classify_cached(image_bytes, profiler)
+        if 'error' not in results:
+            results['test_image'] = sample_path
         results['sample_filename'] = filename
         results['is_demo_sample'] = True
         
-        return jsonify(results)
+        return profiled_response(results, profiler)
         
     except Exception as e:
         return jsonify({'error': f'Processing error: {str(e)}'}), 500
@@ -112,20 +398,54 @@ def test_sample(filename):
 def generate_data():
     """Generate synthetic EEG data"""
     try:
-        generator = EEGSignalGenerator()
-        generator.generate_dataset('data')
-        
-        # Reload reference database
-        processor.load_reference_database(REFERENCE_DIR)
-        
-        return jsonify({
-            'message': 'Dataset generated successfully',
-            'reference_count': len(processor.reference_transforms)
-        })
+        return jsonify(generate_dataset_and_reload())
         
     except Exception as e:
         return jsonify({'error': f'Data generation error: {str(e)}'}), 500
 
+def job_accepted(job):
+    """Response for a newly submitted job, pointing at its status URL"""
+    response = jsonify(job.describe())
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
+@app.route('/jobs/generate_data', methods=['POST'])
+def submit_generate_data():
+    """Generate synthetic EEG data in the background"""
+    job = job_manager.submit('generate_data', lambda job: generate_dataset_and_reload())
+    return job_accepted(job)
+
+@app.route('/jobs/classify', methods=['POST'])
+def submit_classify_directory():
+    """Classify every image in a data directory in the background"""
+    options = request.get_json(silent=True) or {}
+    directory = resolve_data_directory(str(options.get('directory', 'test_samples')))
+    if directory is None:
+        return jsonify({'error': f'Directory must be an existing directory inside {DATA_DIR}'}), 400
+    
+    job = job_manager.submit('classify', classify_directory, directory)
+    return job_accepted(job)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Get the status and progress of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.describe())
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Get the result of a finished job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': f'Job failed: {job.error}'}), 500
+    if not job.finished:
+        return jsonify(job.describe()), 202
+    return jsonify(job.result)
+
 @app.route('/visualize/<path:filename>')
 def visualize_decomposition(filename):
     """Generate wavelet decomposition visualization"""
@@ -139,11 +459,22 @@ def visualize_decomposition(filename):
         if not os.path.exists(image_path):
             return jsonify({'error': 'Image file not found'}), 404
         
-        # Generate visualization
-        viz_path = os.path.join(UPLOAD_FOLDER, f'viz_{filename}')
-        processor.visualize_wavelet_decomposition(image_path, viz_path)
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+        
+        # Serve the cached rendering while the source content is unchanged
+        viz_key = RenderCache.key(image_bytes, processor, variant=VISUALIZATION_RENDERER)
+        viz_name = render_cache.get(viz_key)
+        if viz_name is None:
+            # Reuse the decomposition computed when the image was classified
+            cached = decomposition_cache.get(ResultCache.content_key(image_bytes, processor)) or {}
+            viz_name = render_cache.store(
+                viz_key,
+                lambda viz_path: processor.visualize_wavelet_decomposition(
+                    image_path, viz_path, cached.get('image'), cached.get('decomposition'),
+                    renderer=VISUALIZATION_RENDERER))
         
-        return send_from_directory(UPLOAD_FOLDER, f'viz_{filename}')
+        return send_from_directory(VISUALIZATION_CACHE_DIR, viz_name)
         
     except Exception as e:
         return jsonify({'error': f'Visualization error: {str(e)}'}), 500
@@ -166,7 +497,7 @@ def info():
     """Get system information"""
     try:
         # Count reference patterns
-        ref_count = len(processor.reference_transforms) if processor.reference_transforms else 0
+        ref_count = len(processor.reference_transforms)
         
         # Count test samples
         test_count = 0
@@ -179,7 +510,8 @@ def info():
             'test_samples_available': test_count,
             'wavelet_type': processor.wavelet,
             'decomposition_levels': processor.levels,
-            'classification_threshold': 600
+            'classification_threshold': processor.threshold,
+            'result_cache': result_cache.stats()
         })
         
     except Exception as e:
@@ -188,7 +520,9 @@ def info():
 @app.errorhandler(413)
 def too_large(e):
     """Handle file too large error"""
-    return jsonify({'error': 'File too large. Maximum size is 16MB.'}), 413
+    # Name the limit of the endpoint that was hit; batch uploads allow more
+    limit_mb = (request.max_content_length or 0) // (1024 * 1024)
+    return jsonify({'error': f'File too large. Maximum size is {limit_mb}MB.'}), 413
 
 @app.errorhandler(404)
 def not_found(e):
@@ -1,28 +1,278 @@
 #!/usr/bin/env python
-"""Performance benchmarking for EEG classification"""
+"""
+Performance benchmark suite for EEG classification
 
+Times every stage of the pipeline with warmup and percentiles, writes the
+results as JSON and flags regressions against performance.json
+"""
+
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
 import time
+
 import numpy as np
 from eeg_processor import EEGProcessor
+from reference_set import ReferenceSet
+from signal_generator import EEGSignalGenerator
+
+MSE_SCAN_SIZES = (5, 100, 1000, 10000, 100000)
+
+def time_stage(function, warmup=2, repeat=20):
+    """
+    Time a callable with perf_counter after a few untimed warmup calls
+
+    Args:
+        function: Callable taking no arguments
+        warmup: Number of untimed calls
+        repeat: Number of timed calls
+
+    Returns:
+        Dictionary of timing statistics in milliseconds
+    """
+    for _ in range(warmup):
+        function()
+
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples[i] = time.perf_counter() - start
+    samples *= 1000
+
+    return {
+        'iterations': repeat,
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p90_ms': float(np.percentile(samples, 90)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'min_ms': float(samples.min()),
+        'max_ms': float(samples.max())
+    }
+
+def load_targets(config_path):
+    """Read the benchmark targets from performance.json"""
+    try:
+        with open(config_path) as f:
+            return json.load(f).get('benchmarks', {})
+    except (OSError, ValueError) as e:
+        print(f"Could not read {config_path}: {e}")
+        return {}
+
+def prepare_inputs(work_dir, seed=0):
+    """
+    Render one normal test spectrogram and five references like generate_dataset
+
+    Returns:
+        Tuple of (generator, eeg_signal, test_path, reference_dir)
+    """
+    generator = EEGSignalGenerator(seed=seed)
+    reference_dir = os.path.join(work_dir, 'reference_signals')
+    os.makedirs(reference_dir)
+    for i in range(5):
+        generator.signal_to_spectrogram(generator.generate_normal_eeg(), os.path.join(reference_dir, f'eeg{i+1}n.png'))
+
+    eeg_signal = generator.generate_normal_eeg()
+    test_path = os.path.join(work_dir, 'test_normal.png')
+    generator.signal_to_spectrogram(eeg_signal, test_path)
+    return generator, eeg_signal, test_path, reference_dir
+
+def benchmark_mse_scan(processor, transform, sizes, memory_limit_mb, repeat, warmup, seed=0, large_repeat=None):
+    """
+    Time one exact MSE scan against reference sets of several sizes
+
+    Sizes whose reference matrix would exceed the memory budget are timed
+    as a chunked scan: one block of rows filling at most half the budget
+    is allocated and scanned repeatedly until it covers every reference,
+    as a scan over a memory-mapped set would page through it. The block is
+    larger than any cache, so every pass streams it from memory like a
+    full-size matrix would.
+
+    Args:
+        large_repeat: Timed iterations for chunked sizes (default: repeat)
+    """
+    rng = np.random.default_rng(seed)
+    flat_size = transform.size
+    row_mb = flat_size * processor.dtype.itemsize / (1024 * 1024)
+    results = {}
+    for size in sizes:
+        matrix_mb = size * row_mb
+        chunked = bool(memory_limit_mb) and matrix_mb > memory_limit_mb
+        block_rows = min(size, max(1, int(memory_limit_mb / 2 / row_mb))) if chunked else size
+
+        # Drawn straight in the processor's precision and scaled in place, so
+        # the peak allocation is the block itself
+        matrix = rng.random((block_rows, flat_size), dtype=processor.dtype)
+        matrix *= 255
+        references = ReferenceSet.from_matrix(matrix, transform.shape)
+
+        if chunked:
+            remainder = size % block_rows
+            tail = ReferenceSet.from_matrix(matrix[:remainder], transform.shape,
+                                            norms=references.norms[:remainder]) if remainder else None
+            blocks = [references] * (size // block_rows) + ([tail] if tail else [])
+
+            def scan():
+                return np.concatenate([block.mse(transform) for block in blocks])
+
+            stats = time_stage(scan, min(warmup, 1), large_repeat or repeat)
+            stats.update(chunked=True, block_rows=block_rows, passes=len(blocks), resident_mb=block_rows * row_mb)
+        else:
+            stats = time_stage(lambda: references.mse(transform), warmup, repeat)
+        stats['matrix_mb'] = matrix_mb
+        stats['references_per_second'] = size / (stats['p50_ms'] / 1000) if stats['p50_ms'] else None
+        results[str(size)] = stats
+        del matrix, references
+    return results
+
+def benchmark_upload(processor, image_bytes, repeat, warmup):
+    """Time POST /upload through the Flask test client with the result cache cleared"""
+    import app as app_module
+
+    saved_processor = app_module.processor
+    app_module.processor = processor
+    client = app_module.app.test_client()
 
-def benchmark_classification():
-    processor = EEGProcessor()
-    
-    # Mock reference data
-    processor.reference_transforms = [np.random.rand(128, 128) for _ in range(5)]
-    
-    # Benchmark classification speed
-    times = []
-    for i in range(10):
-        start = time.time()
-        test_data = np.random.rand(256, 256)
-        transform = processor.apply_2d_dwt(test_data)
-        end = time.time()
-        times.append(end - start)
-    
-    print(f"Average processing time: {np.mean(times):.3f}s")
-    print(f"Min time: {np.min(times):.3f}s")
-    print(f"Max time: {np.max(times):.3f}s")
+    def upload():
+        app_module.result_cache.clear()
+        response = client.post('/upload', data={'file': (io.BytesIO(image_bytes), 'benchmark.png')},
+                               content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload returned {response.status_code}: {response.data[:200]}")
+
+    try:
+        return time_stage(upload, warmup, repeat)
+    finally:
+        app_module.processor = saved_processor
+
+def run_benchmarks(repeat=20, warmup=2, sizes=MSE_SCAN_SIZES, config_path='performance.json',
+                   dtype=np.float64, seed=0):
+    """
+    Run every benchmark stage
+
+    Args:
+        repeat: Timed iterations per stage (slow stages use fewer)
+        warmup: Untimed iterations per stage
+        sizes: Reference set sizes for the MSE scan
+        config_path: performance.json with the targets
+        dtype: Floating point type of the processor
+        seed: Seed for generated inputs
+
+    Returns:
+        Dictionary with the environment, per-stage statistics and regressions
+    """
+    targets = load_targets(config_path)
+    memory_limit_mb = targets.get('memory_usage_limit_mb')
+    slow_repeat = max(3, repeat // 4)
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        generator, eeg_signal, test_path, reference_dir = prepare_inputs(work_dir, seed)
+        with open(test_path, 'rb') as f:
+            image_bytes = f.read()
+
+        processor = EEGProcessor(dtype=dtype)
+        processor.load_reference_database(reference_dir)
+        image = processor.load_image(test_path)
+        transform = processor.apply_2d_dwt(image)
+
+        print("Timing decode...")
+        stages['decode_path'] = time_stage(lambda: processor.load_image(test_path), warmup, repeat)
+        stages['decode_bytes'] = time_stage(lambda: processor.load_image(image_bytes), warmup, repeat)
+
+        print("Timing DWT...")
+        stages['dwt'] = time_stage(lambda: processor.apply_2d_dwt(image), warmup, repeat)
+
+        print("Timing MSE scans...")
+        stages['mse_scan'] = benchmark_mse_scan(processor, transform, sizes, memory_limit_mb, repeat, warmup, seed,
+                                                slow_repeat)
+
+        print("Timing end-to-end classification...")
+        stages['classify_end_to_end'] = time_stage(lambda: processor.classify_eeg_pattern(test_path), warmup, repeat)
+        stages['classify_signal'] = time_stage(lambda: processor.classify_signal(eeg_signal, generator.fs),
+                                               warmup, repeat)
+
+        print("Timing Flask /upload...")
+        stages['flask_upload'] = benchmark_upload(processor, image_bytes, repeat, warmup)
+
+        print("Timing spectrogram generation...")
+        spectrogram_path = os.path.join(work_dir, 'spectrogram.png')
+        stages['spectrogram_figure'] = time_stage(
+            lambda: generator.signal_to_spectrogram(eeg_signal, spectrogram_path), 1, slow_repeat)
+        stages['spectrogram_raw'] = time_stage(
+            lambda: generator.signal_to_spectrogram(eeg_signal, spectrogram_path, raw=True), warmup, repeat)
+
+        print("Timing visualization...")
+        visualization_path = os.path.join(work_dir, 'visualization.png')
+        stages['visualization_fast'] = time_stage(
+            lambda: processor.visualize_wavelet_decomposition(test_path, visualization_path, renderer='fast'),
+            warmup, repeat)
+        stages['visualization_matplotlib'] = time_stage(
+            lambda: processor.visualize_wavelet_decomposition(test_path, visualization_path), 1, slow_repeat)
+
+    # Classification requests must finish within the target, also at the tail
+    regressions = []
+    target_seconds = targets.get('classification_time_target')
+    if target_seconds is not None:
+        for stage in ('classify_end_to_end', 'flask_upload'):
+            p99_seconds = stages[stage]['p99_ms'] / 1000
+            if p99_seconds > target_seconds:
+                regressions.append({'stage': stage, 'p99_seconds': p99_seconds, 'target_seconds': target_seconds})
+
+    return {
+        'environment': {
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {
+            'repeat': repeat,
+            'warmup': warmup,
+            'dtype': np.dtype(dtype).name,
+            'targets': targets
+        },
+        'stages': stages,
+        'regressions': regressions
+    }
+
+def print_summary(report):
+    """Print a one-line summary per stage"""
+    for name, stats in report['stages'].items():
+        rows = stats.items() if name == 'mse_scan' else [('', stats)]
+        for size, row in rows:
+            label = f"{name}[{size}]" if size else name
+            chunked = f"   ({row['passes']} passes over {row['block_rows']} rows)" if row.get('chunked') else ''
+            print(f"{label:<32} p50 {row['p50_ms']:9.3f} ms   p99 {row['p99_ms']:9.3f} ms{chunked}")
+
+    for regression in report['regressions']:
+        print(f"REGRESSION: {regression['stage']} p99 {regression['p99_seconds']:.3f}s "
+              f"exceeds the {regression['target_seconds']}s target")
 
 if __name__ == "__main__":
-    benchmark_classification()
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark every stage of EEG classification")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per stage")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed iterations per stage")
+    parser.add_argument("--sizes", type=int, nargs='+', default=list(MSE_SCAN_SIZES),
+                        help="Reference set sizes for the MSE scan")
+    parser.add_argument("--config", default='performance.json', help="Benchmark targets")
+    parser.add_argument("--float32", action='store_true', help="Benchmark the single precision pipeline")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+
+    args = parser.parse_args()
+    report = run_benchmarks(args.repeat, args.warmup, args.sizes, args.config,
+                            np.float32 if args.float32 else np.float64)
+    print_summary(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    sys.exit(1 if report['regressions'] else 0)
@@ -8,94 +8,287 @@ Based on 2013 Brain Mapping using MATLAB Technology project
 import numpy as np
 import pywt
 from PIL import Image
+import io
 import os
+import threading
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from wavelet_render import render_wavelet_decomposition
+from spectrogram import RAW_THRESHOLD, compute_spectrogram, spectrogram_to_image
+from profiling import NULL_PROFILER, StageProfiler
+from reference_set import ReferenceSet
+from reference_index import ReferenceIndex, cascade_search
+from reference_cache import SharedReferenceStore, TransformCache, file_digest, reference_fingerprint
 
 class EEGProcessor:
-    def __init__(self, wavelet='db1', levels=3):
+    def __init__(self, wavelet='db1', levels=3, threshold=600, cache_dir=None, search='exact',
+                 index_options=None, dtype=np.float64, jpeg_draft=False, profile=False,
+                 track_allocations=False, raw_threshold=RAW_THRESHOLD):
         """
         Initialize EEG Processor
         
         Args:
             wavelet: Wavelet type (default: 'db1' as per original project)
             levels: Number of decomposition levels (default: 3)
+            threshold: Default MSE threshold for classification (default: 600)
+            cache_dir: Directory for the persistent reference transform cache
+                       (default: None, no caching)
+            search: Reference search mode, 'exact' for an exhaustive scan,
+                    'approximate' for an indexed shortlist re-ranked by MSE, or
+                    'cascade' for coarse-to-fine matching with early exit
+            index_options: Keyword arguments for ReferenceIndex in approximate mode
+            dtype: Floating point type of images, transforms and the reference
+                   matrix, np.float64 (default) or np.float32
+            jpeg_draft: Let large JPEGs decode at a reduced scale close to the
+                        target size before resizing (default: False)
+            profile: Record per-stage timings of each classification, add
+                     them to the result as 'timings' and log them to the
+                     'brainmapping' logger (default: False)
+            track_allocations: With profile, also track allocations per
+                               stage with tracemalloc (default: False)
+            raw_threshold: Default MSE threshold for raw-mode spectrograms,
+                           used by classify_signal (default: RAW_THRESHOLD)
         """
+        if search not in ('exact', 'approximate', 'cascade'):
+            raise ValueError(f"Unknown search mode: {search}")
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        
         self.wavelet = wavelet
         self.levels = levels
-        self.reference_patterns = []
+        self.threshold = threshold
+        self.raw_threshold = raw_threshold
+        self.dtype = np.dtype(dtype)
+        self.jpeg_draft = jpeg_draft
+        self.cache_dir = cache_dir
+        self.search = search
+        self.index_options = dict(index_options or {})
+        self.profile = profile
+        self.track_allocations = track_allocations
         self.reference_transforms = []
+        self._reference_index = None
+        self._layout_plans = {}
+        self._load_lock = threading.RLock()
+    
+    @property
+    def reference_index(self):
+        """Approximate search index over the current reference set, rebuilt when the set changes"""
+        return self._index_for(self.reference_transforms)
+    
+    def _index_for(self, references):
+        """Return the search index for a reference set snapshot, building it if needed"""
+        index = self._reference_index
+        if index is None or index.references is not references:
+            options = dict(self.index_options)
+            if references.shape is not None:
+                # The coarsest approximation band sits in the top-left of the layout
+                options.setdefault('band_shape', tuple(-(-n // 2 ** self.levels) for n in references.shape))
+            index = ReferenceIndex(references, **options)
+            self._reference_index = index
+        return index
+    
+    def _start_profile(self, profiler, name):
+        """
+        Return the profiler a classification records into
         
-    def load_image(self, image_path):
+        Returns:
+            Tuple of (profiler, owned): the caller's profiler, a new one if
+            profiling is enabled, or a no-op profiler; owned is True when
+            the classification must finish the profile itself
+        """
+        if profiler is not None:
+            return profiler, False
+        if self.profile:
+            return StageProfiler(name, self.track_allocations), True
+        return NULL_PROFILER, False
+    
+    @property
+    def reference_version(self):
+        """Version of the current reference set, changed whenever it is replaced"""
+        return self.reference_transforms.version
+    
+    @property
+    def reference_files(self):
+        """Source file of each reference pattern, in reference order"""
+        return list(self.reference_transforms.files)
+    
+    @property
+    def reference_patterns(self):
+        """Raw reference images, decoded on demand from reference_files"""
+        return [self.load_image(file_path) for file_path in self.reference_files]
+    
+    @property
+    def reference_transforms(self):
+        """
+        Reference wavelet transforms as a stacked ReferenceSet
+        
+        The set is an immutable snapshot that is replaced as a whole, so
+        readers should fetch it once per operation and use that snapshot.
+        """
+        return self._reference_set
+    
+    @reference_transforms.setter
+    def reference_transforms(self, transforms):
+        if not isinstance(transforms, ReferenceSet):
+            transforms = ReferenceSet(transforms, dtype=self.dtype)
+        self._reference_set = transforms
+        
+    def load_image(self, image_source, out=None):
         """
         Load and preprocess image
         
+        Images that are already 256x256 grayscale, such as the spectrograms
+        written by EEGSignalGenerator, skip the convert and resize steps.
+        
         Args:
-            image_path: Path to the image file
+            image_source: Path to the image file, encoded image bytes, or a
+                          binary file object
+            out: Optional preallocated 256x256 array to decode into
             
         Returns:
             numpy array of the processed image
         """
         try:
-            # Load image and convert to grayscale if needed
-            img = Image.open(image_path)
-            img = img.convert('L')  # Convert to grayscale
-            img = img.resize((256, 256))  # Resize to 256x256 as per original
+            if isinstance(image_source, (bytes, bytearray, memoryview)):
+                image_source = io.BytesIO(image_source)
+            
+            with Image.open(image_source) as img:
+                if self.jpeg_draft and img.format == 'JPEG':
+                    # Decode at the smallest DCT scale that still covers 256x256
+                    img.draft('L', (256, 256))
+                
+                if img.mode != 'L':
+                    img = img.convert('L')  # Convert to grayscale
+                if img.size != (256, 256):
+                    img = img.resize((256, 256))  # Resize to 256x256 as per original
+                
+                # Convert to numpy array
+                pixels = np.asarray(img)
             
-            # Convert to numpy array
-            img_array = np.array(img, dtype=np.float64)
+            if out is None:
+                return pixels.astype(self.dtype)
             
-            return img_array
+            np.copyto(out, pixels)
+            return out
         except Exception as e:
-            print(f"Error loading image {image_path}: {e}")
+            print(f"Error loading image {self._source_name(image_source)}: {e}")
             return None
     
-    def apply_2d_dwt(self, image):
+    @staticmethod
+    def _source_name(image_source):
+        """Describe an image source for messages and results"""
+        if isinstance(image_source, (str, os.PathLike)):
+            return os.fspath(image_source)
+        name = getattr(image_source, 'name', None)
+        return name if isinstance(name, str) else '<in-memory image>'
+    
+    def decompose(self, image):
+        """
+        Run the multi-level 2D DWT, keeping every level's approximation
+        
+        Args:
+            image: 2D numpy array representing the image, or an (N, H, W)
+                   stack transformed over its last two axes
+            
+        Returns:
+            List of (cA, (cH, cV, cD)) tuples, one per level, finest first
+        """
+        decomposition = []
+        approximation = np.asarray(image, dtype=self.dtype)
+        for _ in range(self.levels):
+            approximation, details = pywt.dwt2(approximation, self.wavelet)
+            decomposition.append((approximation, details))
+        return decomposition
+    
+    def apply_2d_dwt(self, image, out=None, decomposition=None):
         """
         Apply 2D Discrete Wavelet Transform
         Implements the same algorithm as the original MATLAB code
         
+        The image is decomposed into self.levels levels and the coefficients
+        are written straight into one layout array, nested as in the
+        original project for any number of levels:
+            caa = [cA3 cH3; cV3 cD3]
+            ca = [caa cH2; cV2 cD2]
+            w1 = [ca cH1; cV1 cD1]
+        
         Args:
-            image: 2D numpy array representing the image
+            image: 2D numpy array representing the image, or an (N, H, W)
+                   stack whose images are transformed in one batched call
+            out: Optional preallocated layout array to reuse between calls
+            decomposition: Optional result of decompose(image) to lay out
+                           instead of transforming the image again
             
         Returns:
-            Reconstructed wavelet coefficients as 2D array
+            Reconstructed wavelet coefficients as 2D array, or (N, H', W')
+            for a stack
         """
         try:
-            # Apply 3-level 2D DWT decomposition (as per original project)
-            current_image = image.copy()
+            if decomposition is None:
+                decomposition = self.decompose(image)
+            image_shape = np.shape(image)
+            layout_shape, slices, has_gaps = self._layout_plan(image_shape[-2:])
+            layout_shape = image_shape[:-2] + layout_shape
             
-            # Level 1 decomposition
-            coeffs1 = pywt.dwt2(current_image, self.wavelet)
-            cA1, (cH1, cV1, cD1) = coeffs1
+            # Coarsest approximation first, then details from coarse to fine
+            coeffs = [decomposition[-1][0]] + [details for _, details in reversed(decomposition)]
             
-            # Level 2 decomposition on approximation coefficients
-            coeffs2 = pywt.dwt2(cA1, self.wavelet)
-            cA2, (cH2, cV2, cD2) = coeffs2
+            if out is None:
+                out = np.zeros(layout_shape, dtype=coeffs[0].dtype)
+            elif out.shape != layout_shape:
+                raise ValueError(f"Output buffer has shape {out.shape}, expected {layout_shape}")
+            elif has_gaps:
+                # Padded wavelets leave gaps between bands that must stay zero
+                out.fill(0)
             
-            # Level 3 decomposition on approximation coefficients
-            coeffs3 = pywt.dwt2(cA2, self.wavelet)
-            cA3, (cH3, cV3, cD3) = coeffs3
+            out[(Ellipsis,) + slices[0]] = coeffs[0]
+            for band_slices, details in zip(slices[1:], coeffs[1:]):
+                for band_slice, band in zip(band_slices, details):
+                    out[(Ellipsis,) + band_slice] = band
             
-            # Reconstruct the wavelet representation as per original MATLAB code:
-            # caa = [cA3 cH3; cV3 cD3]
-            # ca = [caa cH2; cV2 cD2]  
-            # w1 = [ca cH1; cV1 cD1]
-            
-            # Level 3 reconstruction
-            caa = np.block([[cA3, cH3], [cV3, cD3]])
-            
-            # Level 2 reconstruction  
-            ca = np.block([[caa, cH2], [cV2, cD2]])
-            
-            # Level 1 reconstruction (final wavelet representation)
-            w1 = np.block([[ca, cH1], [cV1, cD1]])
-            
-            return w1
+            return out
             
         except Exception as e:
             print(f"Error in 2D DWT: {e}")
             return None
     
+    def _layout_plan(self, image_shape):
+        """
+        Work out where each wavelet band goes in the layout array
+        
+        Args:
+            image_shape: Shape of the input image
+            
+        Returns:
+            Tuple of (layout_shape, slices, has_gaps), where slices holds the
+            approximation slice followed by (cH, cV, cD) slices per level,
+            coarsest level first
+        """
+        key = (tuple(image_shape), self.wavelet, self.levels)
+        plans = self._layout_plans
+        if key in plans:
+            return plans[key]
+        
+        shapes = pywt.wavedecn_shapes(image_shape, self.wavelet, level=self.levels)
+        h, w = shapes[0]
+        slices = [(slice(0, h), slice(0, w))]
+        area = h * w
+        
+        for level_shapes in shapes[1:]:
+            dh, dw = level_shapes['dd']
+            # Detail bands go right of and below the block built so far
+            top, left = max(h, dh), max(w, dw)
+            slices.append((
+                (slice(0, dh), slice(left, left + dw)),
+                (slice(top, top + dh), slice(0, dw)),
+                (slice(top, top + dh), slice(left, left + dw))
+            ))
+            h, w = top + dh, left + dw
+            area += 3 * dh * dw
+        
+        plans[key] = ((h, w), slices, area < h * w)
+        return plans[key]
+    
     def calculate_mse(self, img1, img2):
         """
         Calculate Mean Square Error between two images
@@ -121,68 +314,453 @@ class EEGProcessor:
         """
         Load reference (normal) EEG patterns from directory
         
+        With a cache_dir, the stacked reference matrix is shared with other
+        processes through a read-only memory map, and only files whose
+        content changed are decoded and transformed again.
+        
+        The new reference set is built off to the side and published with a
+        single assignment, so concurrent classifications keep using the
+        previous set until the new one is complete and never block.
+        
         Args:
             reference_dir: Directory containing reference pattern images
         """
-        self.reference_patterns = []
-        self.reference_transforms = []
+        with self._load_lock:
+            references = self._build_reference_set(reference_dir)
+            self.reference_transforms = references
         
-        # Load reference images (expecting 5 as per original project)
-        reference_files = [f for f in os.listdir(reference_dir) if f.endswith('.png') or f.endswith('.bmp')]
-        reference_files.sort()  # Ensure consistent ordering
+        print(f"Successfully loaded {len(references)} reference patterns\n")
+    
+    def ensure_reference_database(self, reference_dir):
+        """
+        Load the reference database once if no references are loaded yet
         
-        print(f"Loading {len(reference_files)} reference patterns...")
+        Safe to call from many threads at once: only one of them loads.
+        
+        Args:
+            reference_dir: Directory containing reference pattern images
+        """
+        if len(self.reference_transforms):
+            return
+        
+        with self._load_lock:
+            if not len(self.reference_transforms):
+                self.load_reference_database(reference_dir)
+    
+    def load_reference_images(self, images):
+        """
+        Use in-memory images as the reference patterns
+        
+        Meant for generated references, such as raw-mode spectrograms from
+        EEGSignalGenerator.batch_to_spectrograms, that never touch disk.
+        
+        Args:
+            images: Sequence of reference image arrays
+        """
+        self.reference_transforms = [self.apply_2d_dwt(np.asarray(image, dtype=self.dtype)) for image in images]
+    
+    def _build_reference_set(self, reference_dir):
+        """
+        Build a reference set from a directory without publishing it
         
-        for i, filename in enumerate(reference_files):
-            file_path = os.path.join(reference_dir, filename)
-            img = self.load_image(file_path)
+        Args:
+            reference_dir: Directory containing reference pattern images
+            
+        Returns:
+            ReferenceSet of the loaded reference transforms
+        """
+        # Load reference images (expecting 5 as per original project)
+        filenames = [f for f in os.listdir(reference_dir) if f.endswith('.png') or f.endswith('.bmp')]
+        filenames.sort()  # Ensure consistent ordering
+        
+        print(f"Loading {len(filenames)} reference patterns...")
+        
+        cache = store = None
+        if self.cache_dir:
+            digests = {}
+            for filename in filenames:
+                try:
+                    digests[filename] = file_digest(os.path.join(reference_dir, filename))
+                except OSError as e:
+                    print(f"Failed to read reference pattern {filename}: {e}")
+            filenames = [f for f in filenames if f in digests]
+            fingerprint = reference_fingerprint([(f, digests[f]) for f in filenames],
+                                                self.wavelet, self.levels, self.dtype)
+            
+            # Another process may already have built this exact reference set
+            store = SharedReferenceStore(self.cache_dir)
+            shared = store.open(fingerprint)
+            if shared is not None:
+                references, shared_files = shared
+                print("Using shared reference matrix")
+                return references.with_files(os.path.join(reference_dir, f) for f in shared_files)
             
-            if img is not None:
-                # Apply DWT to reference image
-                wavelet_transform = self.apply_2d_dwt(img)
+            cache = TransformCache(os.path.join(self.cache_dir, 'reference_transforms.npz'))
+        
+        # Rows are written straight into one matrix sized from the file count
+        # (memory-mapped in the store when caching), so no second copy of the
+        # transforms is ever held
+        matrix = shape = None
+        norms = []
+        loaded_files = []
+        try:
+            for i, filename in enumerate(filenames):
+                file_path = os.path.join(reference_dir, filename)
+                
+                # Reuse the cached transform when the file content is unchanged
+                key = wavelet_transform = None
+                if cache is not None:
+                    key = TransformCache.key(digests[filename], self.wavelet, self.levels, self.dtype)
+                    wavelet_transform = cache.get(key)
+                cached = wavelet_transform is not None
+                
+                if not cached:
+                    img = self.load_image(file_path)
+                    if img is None:
+                        print(f"Failed to load reference pattern: {filename}")
+                        continue
+                    
+                    # Apply DWT to reference image
+                    wavelet_transform = self.apply_2d_dwt(img)
+                    if wavelet_transform is None:
+                        print(f"Failed to process reference pattern: {filename}")
+                        continue
                 
-                if wavelet_transform is not None:
-                    self.reference_patterns.append(img)
-                    self.reference_transforms.append(wavelet_transform)
-                    print(f"Loaded reference pattern {i+1}: {filename}")
-                else:
-                    print(f"Failed to process reference pattern: {filename}")
-            else:
-                print(f"Failed to load reference pattern: {filename}")
-        
-        print(f"Successfully loaded {len(self.reference_transforms)} reference patterns\n")
+                if matrix is None:
+                    shape = tuple(wavelet_transform.shape)
+                    rows = (len(filenames), wavelet_transform.size)
+                    matrix = store.create(rows, self.dtype) if store is not None else np.empty(rows, dtype=self.dtype)
+                elif tuple(wavelet_transform.shape) != shape:
+                    raise ValueError(f"Reference {len(loaded_files)} has shape {wavelet_transform.shape}, "
+                                     f"expected {shape}")
+                
+                row = matrix[len(loaded_files)]
+                row[:] = wavelet_transform.ravel()
+                norms.append(np.einsum('i,i->', row, row, dtype=np.float64))
+                loaded_files.append(filename)
+                if cache is not None:
+                    # The cache keeps the matrix row instead of its own copy
+                    if cached:
+                        cache.track(key, row.reshape(shape))
+                    else:
+                        cache.put(key, row.reshape(shape))
+                print(f"Loaded reference pattern {i+1}: {filename}{' (cached)' if cached else ''}")
+        except Exception:
+            if store is not None and matrix is not None:
+                store.discard(matrix)
+            raise
+        
+        reference_files = [os.path.join(reference_dir, f) for f in loaded_files]
+        if matrix is None:
+            return ReferenceSet([], dtype=self.dtype, files=reference_files)
+        references = ReferenceSet.from_matrix(matrix[:len(norms)], shape, norms, files=reference_files)
+        
+        if cache is not None:
+            try:
+                cache.save()
+                # Publish the matrix and map it back read-only
+                store.commit(fingerprint, matrix, norms, shape, loaded_files)
+                shared = store.open(fingerprint)
+                if shared is not None:
+                    references = shared[0].with_files(reference_files)
+            except OSError as e:
+                print(f"Failed to save reference transform cache: {e}")
+        
+        return references
     
-    def classify_eeg_pattern(self, test_image_path, threshold=600):
+    def classify_eeg_pattern(self, test_image_path, threshold=None, profiler=None):
         """
         Classify EEG pattern as normal or abnormal
         Implements the core algorithm from the original project
         
         Args:
-            test_image_path: Path to test image
-            threshold: MSE threshold for classification (default: 0.5 as per original)
+            test_image_path: Path to test image, encoded image bytes, or a
+                             binary file object (e.g. an upload stream)
+            threshold: MSE threshold for classification (default: self.threshold)
+            profiler: StageProfiler to record stages into (its owner reports
+                      them); if None, one is created when self.profile is set
             
         Returns:
             Dictionary containing classification results
         """
+        profiler, owned = self._start_profile(profiler, 'classify')
+        
         # Load test image
-        test_img = self.load_image(test_image_path)
+        with profiler.stage('decode'):
+            test_img = self.load_image(test_image_path)
         if test_img is None:
             return {"error": "Failed to load test image"}
         
+        results = self.classify_image(test_img, threshold, self._source_name(test_image_path), profiler=profiler)
+        if owned:
+            results['timings'] = profiler.finish(image=results.get('test_image'))
+        return results
+    
+    def signal_to_image(self, samples, fs):
+        """
+        Map raw EEG samples to the canonical 256x256 spectrogram image
+        
+        The spectrogram is quantized to uint8 exactly like a raw-mode
+        spectrogram PNG, so the result equals load_image on that file.
+        
+        Args:
+            samples: 1D EEG signal, or (K, N) array of signals
+            fs: Sampling frequency (Hz)
+            
+        Returns:
+            (256, 256) image array, or (K, 256, 256) for several signals
+        """
+        _, _, Sxx_db = compute_spectrogram(np.asarray(samples, dtype=np.float64), fs)
+        return spectrogram_to_image(Sxx_db).astype(self.dtype)
+    
+    def classify_signal(self, samples, fs, threshold=None):
+        """
+        Classify raw EEG samples without rendering or decoding an image
+        
+        Decisions match classifying the spectrogram written by
+        EEGSignalGenerator.signal_to_spectrogram(raw=True), so the
+        references should be raw-mode spectrograms as well. Raw-mode MSE
+        runs on a different scale than rendered figures, hence the
+        separate default threshold.
+        
+        Args:
+            samples: 1D EEG signal, or (K, N) array of signals
+            fs: Sampling frequency (Hz)
+            threshold: MSE threshold for classification (default: self.raw_threshold)
+            
+        Returns:
+            Dictionary containing classification results, or a list of them
+            for several signals
+        """
+        if threshold is None:
+            threshold = self.raw_threshold
+        images = self.signal_to_image(samples, fs)
+        if images.ndim == 2:
+            return self.classify_image(images, threshold)
+        return self.classify_batch(list(images), threshold)
+    
+    def classify_image(self, image, threshold=None, test_image=None, decomposition=None, profiler=None):
+        """
+        Classify an already loaded EEG image
+        
+        Args:
+            image: 2D numpy array of the preprocessed image
+            threshold: MSE threshold for classification (default: self.threshold)
+            test_image: Name of the image reported in the results
+            decomposition: Optional result of decompose(image) to reuse
+            profiler: StageProfiler to record stages into (its owner reports
+                      them); if None, one is created when self.profile is set
+            
+        Returns:
+            Dictionary containing classification results
+        """
+        if threshold is None:
+            threshold = self.threshold
+        profiler, owned = self._start_profile(profiler, 'classify')
+        
+        # One snapshot for the whole classification, even if a reload publishes a new set meanwhile
+        references = self.reference_transforms
+        if not len(references):
+            return {"error": "No reference patterns loaded"}
+        
         # Apply DWT to test image
-        test_transform = self.apply_2d_dwt(test_img)
+        with profiler.stage('dwt'):
+            test_transform = self.apply_2d_dwt(image, decomposition=decomposition)
         if test_transform is None:
             return {"error": "Failed to apply DWT to test image"}
         
         # Calculate MSE with each reference pattern
-        mse_values = []
-        for i, ref_transform in enumerate(self.reference_transforms):
-            mse = self.calculate_mse(test_transform, ref_transform)
-            mse_values.append(mse)
+        with profiler.stage('mse_search'):
+            mse_values = self._score_transforms([test_transform], threshold, references)[0]
+        
+        with profiler.stage('build_result'):
+            results = self._build_result(mse_values, threshold, test_image, test_transform.shape)
+        if owned:
+            results['timings'] = profiler.finish(image=test_image)
+        return results
+    
+    def classify_batch(self, images, threshold=None, batch_size=64, profiler=None):
+        """
+        Classify several EEG patterns against the reference database at once
+        
+        Test transforms are stacked into an (N, H, W) array and scored against
+        the reference matrix in a single matrix multiply, instead of one
+        calculate_mse call per pair.
+        
+        Args:
+            images: Iterable of image paths, encoded image bytes, binary file
+                    objects or already loaded 2D image arrays
+            threshold: MSE threshold for classification (default: self.threshold)
+            batch_size: Number of test images scored per matrix multiply
+            profiler: StageProfiler to record stages into; if None, one is
+                      created when self.profile is set and only logged, as
+                      the stages cover the whole batch
+            
+        Returns:
+            List of result dictionaries in the same format as classify_eeg_pattern
+        """
+        if threshold is None:
+            threshold = self.threshold
+        profiler, owned = self._start_profile(profiler, 'classify_batch')
+        
+        images = list(images)
+        references = self.reference_transforms
+        if not len(references):
+            return [{"error": "No reference patterns loaded"} for _ in images]
+        
+        results = [None] * len(images)
+        
+        for start in range(0, len(images), batch_size):
+            positions = []
+            transforms = []
+            
+            for position in range(start, min(start + batch_size, len(images))):
+                image = images[position]
+                with profiler.stage('decode'):
+                    test_img = image if isinstance(image, np.ndarray) else self.load_image(image)
+                if test_img is None:
+                    results[position] = {"error": "Failed to load test image"}
+                    continue
+                
+                with profiler.stage('dwt'):
+                    test_transform = self.apply_2d_dwt(test_img)
+                if test_transform is None:
+                    results[position] = {"error": "Failed to apply DWT to test image"}
+                    continue
+                
+                positions.append(position)
+                transforms.append(test_transform)
+            
+            if not transforms:
+                continue
+            
+            with profiler.stage('mse_search'):
+                mse_matrix = self._score_transforms(transforms, threshold, references)
+            
+            with profiler.stage('build_result'):
+                for position, test_transform, mse_values in zip(positions, transforms, mse_matrix):
+                    image = images[position]
+                    test_image = None if isinstance(image, np.ndarray) else self._source_name(image)
+                    results[position] = self._build_result(mse_values, threshold, test_image, test_transform.shape)
+        
+        if owned:
+            profiler.finish(images=len(images))
+        return results
+    
+    def classify_transforms(self, transforms, threshold=None, references=None):
+        """
+        Classify wavelet transforms that were already computed
+        
+        Args:
+            transforms: Sequence of 2D layouts, or an (N, H, W) stack, as
+                        returned by apply_2d_dwt
+            threshold: MSE threshold for classification (default: self.threshold)
+            references: ReferenceSet (or list of transforms) to score
+                        against instead of the loaded reference set
+            
+        Returns:
+            List of result dictionaries in the same format as classify_image
+        """
+        if threshold is None:
+            threshold = self.threshold
+        if references is None:
+            references = self.reference_transforms
+        elif not isinstance(references, ReferenceSet):
+            references = ReferenceSet(references, dtype=self.dtype)
+        
+        transforms = list(transforms)
+        if not len(references):
+            return [{"error": "No reference patterns loaded"} for _ in transforms]
+        if not transforms:
+            return []
+        
+        mse_matrix = self._score_transforms(transforms, threshold, references)
+        return [self._build_result(mse_values, threshold, None, transform.shape)
+                for transform, mse_values in zip(transforms, mse_matrix)]
+    
+    def evaluate_index(self, images):
+        """
+        Report how well approximate search agrees with the exhaustive scan
+        
+        Args:
+            images: Iterable of image paths or already loaded 2D image arrays
+            
+        Returns:
+            Dictionary with the top-1 recall of the index and its settings
+        """
+        references = self.reference_transforms
+        if not len(references):
+            return {"error": "No reference patterns loaded", "recall": None, "evaluated_images": 0,
+                    "reference_count": 0}
+        
+        transforms = []
+        for image in images:
+            test_img = image if isinstance(image, np.ndarray) else self.load_image(image)
+            if test_img is not None:
+                test_transform = self.apply_2d_dwt(test_img)
+                if test_transform is not None:
+                    transforms.append(test_transform)
+        
+        index = self._index_for(references)
+        return {
+            "recall": index.recall(np.stack(transforms)) if transforms else None,
+            "evaluated_images": len(transforms),
+            "key": index.key,
+            "shortlist": index.shortlist,
+            "reference_count": len(references)
+        }
+    
+    def _score_transforms(self, transforms, threshold, references):
+        """
+        Score test transforms against the reference database
+        
+        Args:
+            transforms: List of 2D test wavelet transforms
+            threshold: MSE threshold for classification, used by the cascade
+            references: ReferenceSet snapshot to score against
+            
+        Returns:
+            One list of MSE values per transform, indexed by reference. In
+            approximate mode references outside the shortlist are None, and
+            in cascade mode so are references pruned before the full layout.
+        """
+        if not all(t.shape == references.shape for t in transforms):
+            # Shapes differ from the references: fall back to cropping per pair
+            return [[self.calculate_mse(t, ref) for ref in references] for t in transforms]
+        
+        if self.search == 'cascade':
+            return [cascade_search(references, t, self.levels, threshold)[0] for t in transforms]
+        
+        tests = np.stack(transforms)
+        if self.search == 'exact':
+            return references.mse(tests).tolist()
+        
+        candidates, mse = self._index_for(references).search(tests)
+        rows = []
+        for candidate_rows, candidate_mse in zip(candidates, mse):
+            mse_values = [None] * len(references)
+            for reference, value in zip(candidate_rows.tolist(), candidate_mse.tolist()):
+                mse_values[reference] = value
+            rows.append(mse_values)
+        return rows
+    
+    def _build_result(self, mse_values, threshold, test_image, transform_shape):
+        """
+        Turn the MSE values of one test image into a classification result
         
+        Args:
+            mse_values: MSE against each reference pattern (None if not scored)
+            threshold: MSE threshold for classification
+            test_image: Path of the test image (reported back to the caller)
+            transform_shape: Shape of the test wavelet transform
+            
+        Returns:
+            Dictionary containing classification results
+        """
         # Find minimum MSE
-        min_mse = min(mse_values)
-        matched_frame = mse_values.index(min_mse) + 1  # 1-indexed as per original
+        best = min((i for i, mse in enumerate(mse_values) if mse is not None), key=mse_values.__getitem__)
+        min_mse = mse_values[best]
+        matched_frame = best + 1  # 1-indexed as per original
         
         # Classification decision
         if min_mse < threshold:
@@ -200,40 +778,59 @@ class EEGProcessor:
             "matched_frame": matched_frame if classification == "Normal" else None,
             "all_mse_values": mse_values,
             "threshold": threshold,
-            "test_image": test_image_path,
+            "test_image": test_image,
             "wavelet_coefficients": {
-                "test_transform_shape": test_transform.shape,
-                "reference_count": len(self.reference_transforms)
+                "test_transform_shape": transform_shape,
+                "reference_count": len(mse_values)
             }
         }
         
         return results
     
-    def visualize_wavelet_decomposition(self, image_path, save_path=None):
+    def visualize_wavelet_decomposition(self, image_path, save_path=None, image=None, decomposition=None,
+                                        renderer='matplotlib'):
         """
         Visualize the wavelet decomposition process
         
         Args:
             image_path: Path to input image
             save_path: Path to save visualization (optional)
+            image: Already loaded image, to skip loading image_path (optional)
+            decomposition: Result of decompose(image) to reuse (optional)
+            renderer: 'matplotlib' for an annotated figure, or 'fast' to tile
+                      the normalized bands with PIL (thread-safe, no pyplot)
+            
+        Returns:
+            Encoded PNG bytes for the 'fast' renderer, otherwise None
         """
+        if renderer not in ('matplotlib', 'fast'):
+            raise ValueError(f"Unknown renderer: {renderer}")
+        
         # Load image
-        img = self.load_image(image_path)
+        img = self.load_image(image_path) if image is None else image
         if img is None:
             return
         
-        # Apply DWT
-        coeffs1 = pywt.dwt2(img, self.wavelet)
-        cA1, (cH1, cV1, cD1) = coeffs1
+        # Apply DWT, reusing the decomposition from classification if given
+        if decomposition is None:
+            decomposition = self.decompose(img)
+        
+        # The panels show three levels even for shallower decompositions
+        levels = list(decomposition)
+        while len(levels) < 3:
+            levels.append(pywt.dwt2(levels[-1][0] if levels else img, self.wavelet))
         
-        coeffs2 = pywt.dwt2(cA1, self.wavelet)
-        cA2, (cH2, cV2, cD2) = coeffs2
+        if renderer == 'fast':
+            final_transform = self.apply_2d_dwt(img, decomposition=decomposition)
+            return render_wavelet_decomposition(img, levels, final_transform, self.levels, save_path)
         
-        coeffs3 = pywt.dwt2(cA2, self.wavelet)
-        cA3, (cH3, cV3, cD3) = coeffs3
+        cA1, (cH1, cV1, cD1) = levels[0]
+        cA2 = levels[1][0]
+        cA3 = levels[2][0]
         
-        # Create visualization
-        fig, axes = plt.subplots(2, 4, figsize=(16, 8))
+        # Create visualization; saved figures bypass pyplot's global state
+        fig = Figure(figsize=(16, 8)) if save_path else plt.figure(figsize=(16, 8))
+        axes = fig.subplots(2, 4)
         
         # Original image
         axes[0, 0].imshow(img, cmap='gray')
@@ -267,16 +864,15 @@ class EEGProcessor:
         axes[1, 2].axis('off')
         
         # Final wavelet representation
-        final_transform = self.apply_2d_dwt(img)
+        final_transform = self.apply_2d_dwt(img, decomposition=decomposition)
         axes[1, 3].imshow(final_transform, cmap='gray')
-        axes[1, 3].set_title('3-Level Wavelet Transform')
+        axes[1, 3].set_title(f'{self.levels}-Level Wavelet Transform')
         axes[1, 3].axis('off')
         
-        plt.tight_layout()
+        fig.tight_layout()
         
         if save_path:
-            plt.savefig(save_path, dpi=150, bbox_inches='tight')
-            plt.close()
+            fig.savefig(save_path, dpi=150, bbox_inches='tight')
         else:
             plt.show()
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Background Jobs for Brain Mapping Project
+Runs long tasks such as dataset generation and bulk classification on a
+local worker pool, so web requests only submit work and poll for results
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    def __init__(self, kind):
+        """
+        Initialize the state of one submitted job
+
+        Args:
+            kind: Short name of the task, reported back to clients
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self.result = None
+        self.error = None
+
+    def report_progress(self, done, total):
+        """Record how many of the job's work items are finished"""
+        self.progress = {'done': done, 'total': total}
+
+    @property
+    def finished(self):
+        return self.status in ('finished', 'failed')
+
+    def describe(self):
+        """
+        Summarize the job without its result
+
+        Returns:
+            Dictionary with the job id, kind, status, timestamps, progress
+            and error message
+        """
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+            'error': self.error
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers=None, max_jobs=256):
+        """
+        Initialize a job manager with a local worker pool
+
+        Args:
+            max_workers: Number of worker threads (ThreadPoolExecutor default
+                         if None). NumPy and PyWavelets release the GIL, and
+                         dataset generation can fan out to processes itself.
+            max_jobs: Number of jobs remembered; the oldest finished jobs
+                      are forgotten first
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='brainmapping-job')
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, function, *args, **kwargs):
+        """
+        Queue a task on the worker pool
+
+        Args:
+            kind: Short name of the task
+            function: Callable run as function(job, *args, **kwargs); it may
+                      call job.report_progress and its return value becomes
+                      the job result
+
+        Returns:
+            The new Job
+        """
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        self.executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        """Run a job on a worker thread and record its outcome"""
+        job.started_at = time.time()
+        job.status = 'running'
+        try:
+            job.result = function(job, *args, **kwargs)
+            job.status = 'finished'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = time.time()
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond max_jobs"""
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished][:excess]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Look up a job
+
+        Returns:
+            The Job, or None if the id is unknown or was forgotten
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None, interval=0.05):
+        """
+        Block until a job has finished
+
+        Args:
+            job_id: Id of the job
+            timeout: Maximum number of seconds to wait (None for no limit)
+            interval: Polling interval in seconds
+
+        Returns:
+            The Job, or None if the id is unknown
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        job = self.get(job_id)
+        while job is not None and not job.finished:
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(interval)
+        return job
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and optionally wait for running ones"""
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Multi-Channel Montage for Brain Mapping Project
+Classifies every electrode of a (channels, samples) recording with batched
+spectrograms and wavelet transforms spread over a thread pool, and
+aggregates the per-channel decisions into one result
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from reference_set import ReferenceSet
+
+
+def build_channel_references(processor, recordings, fs):
+    """
+    Build one reference set per channel from normal multi-channel recordings
+
+    Args:
+        processor: EEGProcessor whose wavelet settings are used
+        recordings: Sequence of (channels, samples) normal recordings
+        fs: Sampling frequency (Hz)
+
+    Returns:
+        List with one ReferenceSet per channel
+    """
+    transforms = [processor.apply_2d_dwt(processor.signal_to_image(recording, fs)) for recording in recordings]
+    return [ReferenceSet([layouts[channel] for layouts in transforms], dtype=processor.dtype)
+            for channel in range(transforms[0].shape[0])]
+
+
+class MontageClassifier:
+    def __init__(self, processor, channel_references=None, fs=256, channel_names=None,
+                 min_abnormal_channels=1, max_workers=None, dwt_batch_size=4):
+        """
+        Initialize a multi-channel classifier
+
+        Args:
+            processor: EEGProcessor used for spectrograms, transforms and the
+                       shared reference set
+            channel_references: One ReferenceSet (or list of transforms) per
+                                channel, or None to score every channel
+                                against the processor's reference set
+            fs: Sampling frequency (Hz)
+            channel_names: Optional electrode name per channel, e.g. 'Fp1'
+            min_abnormal_channels: Number of abnormal channels that makes the
+                                   whole montage abnormal
+            max_workers: Number of worker threads (default: one per CPU);
+                         pywt and NumPy release the GIL, so channel groups
+                         run in parallel
+            dwt_batch_size: Channels transformed per pywt call; small stacks
+                            keep the working set in cache, which measured
+                            faster than transforming a whole group at once
+        """
+        self.processor = processor
+        self.fs = fs
+        self.channel_names = list(channel_names) if channel_names is not None else None
+        self.min_abnormal_channels = min_abnormal_channels
+        self.dwt_batch_size = dwt_batch_size
+        self.channel_references = None
+        if channel_references is not None:
+            self.channel_references = [
+                references if isinstance(references, ReferenceSet) else ReferenceSet(references, dtype=processor.dtype)
+                for references in channel_references
+            ]
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='brainmapping-montage')
+
+    def close(self):
+        """Shut down the worker threads"""
+        self.executor.shutdown()
+
+    def _classify_group(self, images, channels, threshold, shared):
+        """Transform a group of channel images in small stacks and score them together"""
+        transforms = []
+        for start in range(0, len(images), self.dwt_batch_size):
+            stack = self.processor.apply_2d_dwt(images[start:start + self.dwt_batch_size])
+            if stack is None:
+                return [{"error": "Failed to apply DWT to test image"} for _ in channels]
+            transforms.extend(stack)
+        if self.channel_references is None:
+            return self.processor.classify_transforms(transforms, threshold, shared)
+        return [self.processor.classify_transforms([transform], threshold, self.channel_references[channel])[0]
+                for channel, transform in zip(channels, transforms)]
+
+    def classify(self, data, threshold=None):
+        """
+        Classify a multi-channel recording
+
+        All channel spectrograms are computed in one call, then channels are
+        split into one group per worker. Each group is transformed in small
+        stacks and scored against the references with one matrix product.
+
+        Args:
+            data: (channels, samples) array
+            threshold: MSE threshold for classification (default: the
+                       processor's raw_threshold, as channels are raw-mode images)
+
+        Returns:
+            Dictionary with the montage classification, the abnormal
+            channels and the per-channel results
+        """
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 2:
+            raise ValueError(f"Expected a (channels, samples) array, got shape {data.shape}")
+        if self.channel_references is not None and len(self.channel_references) != len(data):
+            raise ValueError(f"Got {len(data)} channels but {len(self.channel_references)} reference sets")
+        if self.channel_names is not None and len(self.channel_names) != len(data):
+            raise ValueError(f"Got {len(data)} channels but {len(self.channel_names)} channel names")
+
+        if threshold is None:
+            threshold = self.processor.raw_threshold
+        images = self.processor.signal_to_image(data, self.fs)
+
+        # One snapshot of the shared references for every group
+        shared = self.processor.reference_transforms
+        groups = [group for group in np.array_split(np.arange(len(data)), self.max_workers) if len(group)]
+        futures = [self.executor.submit(self._classify_group, images[group], group.tolist(), threshold, shared)
+                   for group in groups]
+
+        channels = []
+        for group, future in zip(groups, futures):
+            for channel, result in zip(group.tolist(), future.result()):
+                result['channel'] = channel
+                if self.channel_names is not None:
+                    result['channel_name'] = self.channel_names[channel]
+                channels.append(result)
+
+        errors = [r for r in channels if 'error' in r]
+        if errors:
+            return {"error": errors[0]['error'], "channels": channels}
+
+        abnormal = [r['channel'] for r in channels if r['classification'] == 'Abnormal']
+        return {
+            "classification": "Abnormal" if len(abnormal) >= self.min_abnormal_channels else "Normal",
+            "abnormal_channels": abnormal,
+            "abnormal_count": len(abnormal),
+            "channel_count": len(channels),
+            "min_mse": min(r['min_mse'] for r in channels),
+            "max_mse": max(r['min_mse'] for r in channels),
+            "channels": channels
+        }
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Stage Profiling for Brain Mapping Project
+Opt-in per-stage timing and allocation tracking for classification
+requests, reported in results, logged to the 'brainmapping' logger and
+passed to registered callbacks for external profilers
+"""
+
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger('brainmapping')
+
+_callbacks = []
+_callbacks_lock = threading.Lock()
+
+
+def register_callback(callback):
+    """
+    Call a function with every finished profile
+
+    Args:
+        callback: Callable taking (name, report, context), where report is
+                  the dictionary from StageProfiler.report and context holds
+                  extra details such as the request path
+    """
+    with _callbacks_lock:
+        _callbacks.append(callback)
+
+
+def unregister_callback(callback):
+    """Stop calling a previously registered callback"""
+    with _callbacks_lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+class StageProfiler:
+    def __init__(self, name, track_allocations=False):
+        """
+        Initialize a profiler for one classification or request
+
+        Args:
+            name: Name of the profiled operation, e.g. 'upload'
+            track_allocations: Also record allocated and peak memory per
+                               stage with tracemalloc. Tracing is started on
+                               first use and left running; its figures are
+                               process-wide, so concurrent requests blur them.
+        """
+        self.name = name
+        self.track_allocations = track_allocations
+        self.stages = {}
+        self.started = time.perf_counter()
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, stage_name):
+        """
+        Time a block as one stage; repeated stages are accumulated
+
+        Args:
+            stage_name: Name of the stage, e.g. 'decode' or 'dwt'
+        """
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            entry = self.stages.setdefault(stage_name, {'ms': 0.0, 'calls': 0})
+            entry['ms'] += elapsed_ms
+            entry['calls'] += 1
+            if self.track_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                entry['allocated_kb'] = entry.get('allocated_kb', 0.0) + (current - before) / 1024
+                entry['peak_kb'] = max(entry.get('peak_kb', 0.0), (peak - before) / 1024)
+
+    def report(self):
+        """
+        Summarize the stages recorded so far
+
+        Returns:
+            Dictionary with the total time and a copy of each stage's
+            duration, call count and (if tracked) allocations
+        """
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'stages': {name: dict(entry) for name, entry in self.stages.items()}
+        }
+
+    def finish(self, **context):
+        """
+        Log the profile and pass it to every registered callback
+
+        Args:
+            **context: Extra details passed to the callbacks and logged
+
+        Returns:
+            The final report
+        """
+        report = self.report()
+        stages = ' '.join(f"{name}={entry['ms']:.2f}ms" for name, entry in report['stages'].items())
+        details = ' '.join(f"{key}={value}" for key, value in context.items())
+        logger.info(f"timings {self.name}: total={report['total_ms']:.2f}ms {stages} {details}".rstrip())
+
+        with _callbacks_lock:
+            callbacks = list(_callbacks)
+        for callback in callbacks:
+            try:
+                callback(self.name, report, context)
+            except Exception as e:
+                logger.warning(f"Profiling callback {callback!r} failed: {e}")
+        return report
+
+
+class NullProfiler:
+    """Profiler that records nothing, used when profiling is off"""
+
+    def stage(self, stage_name):
+        return nullcontext()
+
+    def report(self):
+        return None
+
+    def finish(self, **context):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+Reference Cache for Brain Mapping Project
+Persists reference wavelet transforms on disk so a warm start only
+re-transforms reference images whose content has changed, and shares the
+stacked reference matrix between worker processes through a memory map
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from reference_set import ReferenceSet
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    Calculate the SHA-256 digest of a file's content
+
+    Args:
+        file_path: Path to the file
+        chunk_size: Number of bytes read at a time
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TransformCache:
+    def __init__(self, cache_path):
+        """
+        Initialize a cache of wavelet transforms stored in one .npz file
+
+        Transforms are read from the file on demand, so opening a large
+        cache does not load every entry into memory.
+
+        Args:
+            cache_path: Path of the .npz cache file
+        """
+        self.cache_path = cache_path
+        self.entries = {}
+        self.stored = set()
+        self.used = set()
+        self.dirty = False
+        self._archive = None
+
+        if os.path.exists(cache_path):
+            try:
+                self._archive = np.load(cache_path)
+                self.stored = set(self._archive.files)
+            except Exception as e:
+                print(f"Ignoring unreadable transform cache {cache_path}: {e}")
+
+    @staticmethod
+    def key(digest, wavelet, levels, dtype=np.float64):
+        """Build the cache key for a file digest and wavelet configuration"""
+        return f"{digest}-{wavelet}-{levels}-{np.dtype(dtype).name}"
+
+    def get(self, key):
+        """
+        Look up a cached transform
+
+        Returns:
+            The cached 2D transform, or None on a miss
+        """
+        transform = self.entries.get(key)
+        if transform is None and key in self.stored:
+            try:
+                transform = self._archive[key]
+            except Exception as e:
+                print(f"Ignoring unreadable transform cache entry {key}: {e}")
+        if transform is not None:
+            self.used.add(key)
+        return transform
+
+    def put(self, key, transform):
+        """Store a transform under the given key"""
+        self.entries[key] = transform
+        self.used.add(key)
+        self.dirty = True
+
+    def track(self, key, transform):
+        """
+        Keep an unchanged entry, pointing it at an equal copy held elsewhere
+
+        Used with rows of the shared reference matrix, so saving the cache
+        does not need a second in-memory copy of every transform.
+        """
+        self.entries[key] = transform
+        self.used.add(key)
+
+    def save(self):
+        """
+        Write the cache back to disk, keeping only entries used since loading
+
+        The file is written to a temporary name and renamed into place so
+        concurrent readers never see a partial cache.
+        """
+        stale = self.stored - self.used
+        if not self.dirty and not stale:
+            return
+
+        entries = {key: self.entries[key] if key in self.entries else self._archive[key] for key in self.used}
+
+        directory = os.path.dirname(self.cache_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.npz', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **entries)
+            os.replace(temp_path, self.cache_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        self.entries = entries
+        self.stored = set(entries)
+        self.dirty = False
+
+
+def reference_fingerprint(digests, wavelet, levels, dtype=np.float64):
+    """
+    Fingerprint a reference set from its file digests and wavelet configuration
+
+    Args:
+        digests: Sequence of (filename, content digest) pairs in load order
+        wavelet: Wavelet type
+        levels: Number of decomposition levels
+        dtype: Floating point type of the stored transforms
+
+    Returns:
+        Hex digest identifying the reference set
+    """
+    fingerprint = hashlib.sha256(f"{wavelet}-{levels}-{np.dtype(dtype).name}".encode())
+    for filename, digest in digests:
+        fingerprint.update(f"\n{filename}:{digest}".encode())
+    return fingerprint.hexdigest()
+
+
+class SharedReferenceStore:
+    def __init__(self, store_dir):
+        """
+        Initialize a reference matrix store shared between processes
+
+        The matrix is written once as a .npy file and opened read-only with
+        np.memmap by every process, so the pages are shared through the OS
+        page cache instead of being copied into each worker.
+
+        Args:
+            store_dir: Directory holding the matrix and its metadata
+        """
+        self.store_dir = store_dir
+        self.metadata_path = os.path.join(store_dir, 'reference_matrix.json')
+
+    def open(self, fingerprint):
+        """
+        Open the stored reference matrix if it matches the fingerprint
+
+        Args:
+            fingerprint: Expected reference set fingerprint
+
+        Returns:
+            Tuple of (ReferenceSet, filenames), or None if the store is
+            missing or was built from a different reference set
+        """
+        try:
+            with open(self.metadata_path) as f:
+                metadata = json.load(f)
+            if metadata.get('fingerprint') != fingerprint:
+                return None
+
+            matrix = np.load(os.path.join(self.store_dir, metadata['matrix']), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+
+        references = ReferenceSet.from_matrix(matrix, metadata['shape'], metadata['norms'])
+        return references, metadata['files']
+
+    def create(self, shape, dtype):
+        """
+        Create a writable matrix in the store, to be filled row by row
+
+        The matrix is a memory-mapped .npy file under a temporary name;
+        commit() publishes it.
+
+        Args:
+            shape: (rows, H*W) shape of the matrix
+            dtype: Floating point type of the matrix
+
+        Returns:
+            Writable np.memmap
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.store_dir)
+        os.close(fd)
+        return np.lib.format.open_memmap(temp_path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def discard(self, matrix):
+        """Remove a matrix from create() that will not be committed"""
+        try:
+            os.remove(matrix.filename)
+        except OSError:
+            pass
+
+    def commit(self, fingerprint, matrix, norms, shape, filenames):
+        """
+        Publish a matrix from create() as the stored reference set
+
+        The matrix is renamed to a fingerprint-specific file and the
+        metadata is renamed into place last, so a concurrent reader sees
+        either the old or the new set, never a partial one.
+
+        Args:
+            fingerprint: Fingerprint of the reference set
+            matrix: Matrix from create(); only the first len(norms) rows are kept
+            norms: Squared norm of each filled row
+            shape: 2D shape of each reference transform
+            filenames: Reference filenames in matrix row order
+        """
+        matrix_name = f"reference_matrix-{fingerprint[:16]}.npy"
+        if len(norms) < len(matrix):
+            # Some references failed to load: copy the filled rows to a smaller file
+            compact = self.create((len(norms), matrix.shape[1]), matrix.dtype)
+            for i in range(len(norms)):
+                compact[i] = matrix[i]
+            self.discard(matrix)
+            matrix = compact
+
+        matrix.flush()
+        os.replace(matrix.filename, os.path.join(self.store_dir, matrix_name))
+        metadata = {
+            'fingerprint': fingerprint,
+            'matrix': matrix_name,
+            'shape': list(shape) if shape is not None else None,
+            'norms': [float(norm) for norm in norms],
+            'files': list(filenames)
+        }
+        self._write_atomic(os.path.basename(self.metadata_path),
+                           lambda f: f.write(json.dumps(metadata).encode()))
+
+        # Processes still mapping an old matrix keep their pages until they unmap it
+        for name in os.listdir(self.store_dir):
+            if name.startswith('reference_matrix-') and name.endswith('.npy') and name != matrix_name:
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass
+
+    def write(self, fingerprint, references, filenames):
+        """
+        Write an in-memory reference set to the store
+
+        Args:
+            fingerprint: Fingerprint of the reference set
+            references: ReferenceSet to store
+            filenames: Reference filenames in matrix row order
+        """
+        matrix = self.create(references.matrix.shape, references.matrix.dtype)
+        matrix[:] = references.matrix
+        self.commit(fingerprint, matrix, references.norms, references.shape, filenames)
+
+    def _write_atomic(self, name, write):
+        """Write a file in the store through a temporary file and rename"""
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.store_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, os.path.join(self.store_dir, name))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Reference Index for Brain Mapping Project
+Faster nearest-reference search for large reference libraries: an
+approximate index that re-ranks a shortlist by exact MSE, and an exact
+coarse-to-fine cascade over the wavelet pyramid
+"""
+
+import numpy as np
+
+
+class ReferenceIndex:
+    def __init__(self, references, key='approximation', band_shape=(32, 32),
+                 components=64, shortlist=32, sample_size=1024, seed=0):
+        """
+        Build a search index over a ReferenceSet
+
+        Args:
+            references: ReferenceSet to index
+            key: 'approximation' to use the coarsest approximation band
+                 (the top-left block of the wavelet layout, cA3 by default),
+                 or 'pca' to project the full layout onto its principal axes
+            band_shape: Shape of the approximation band used as key
+            components: Number of principal components for the 'pca' key
+            shortlist: Number of candidates re-ranked by exact MSE
+            sample_size: Number of references used to fit the PCA basis
+            seed: Seed for choosing the PCA sample
+        """
+        if key not in ('approximation', 'pca'):
+            raise ValueError(f"Unknown index key: {key}")
+
+        self.references = references
+        self.key = key
+        self.band_shape = tuple(band_shape)
+        self.shortlist = shortlist
+        self.basis = None
+        self.mean = None
+
+        if key == 'pca' and len(references):
+            rng = np.random.default_rng(seed)
+            rows = np.sort(rng.choice(len(references), min(sample_size, len(references)), replace=False))
+            sample = np.asarray(references.matrix[rows], dtype=np.float64)
+            self.mean = sample.mean(axis=0)
+            _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+            self.basis = vt[:components]
+
+        self.keys = self._keys(references.matrix)
+        self.key_norms = np.einsum('ij,ij->i', self.keys, self.keys)
+
+    def _keys(self, flat, chunk_size=1024):
+        """
+        Compute search keys for flattened transforms
+
+        Args:
+            flat: (N, H*W) array of flattened transforms
+
+        Returns:
+            (N, K) array of keys
+        """
+        if self.key == 'approximation':
+            if not len(flat):
+                return np.empty((0, int(np.prod(self.band_shape))))
+            h, w = self.band_shape
+            layout = flat.reshape(len(flat), *self.references.shape)
+            return np.ascontiguousarray(layout[:, :h, :w].reshape(len(flat), -1), dtype=np.float64)
+
+        if self.basis is None:
+            return np.empty((len(flat), 0))
+
+        # Project in chunks so memory-mapped references are streamed, not copied
+        keys = np.empty((len(flat), len(self.basis)))
+        for start in range(0, len(flat), chunk_size):
+            chunk = np.asarray(flat[start:start + chunk_size], dtype=np.float64)
+            keys[start:start + chunk_size] = (chunk - self.mean) @ self.basis.T
+        return keys
+
+    def search(self, tests):
+        """
+        Find each test transform's nearest references
+
+        Args:
+            tests: (N, H, W) array of test transforms
+
+        Returns:
+            Tuple of (candidates, mse): (N, M) reference indices in the
+            shortlist and their exact MSE values (M is 0 without references)
+        """
+        if not len(self.references):
+            return np.empty((len(tests), 0), dtype=int), np.empty((len(tests), 0))
+
+        flat = tests.reshape(len(tests), -1)
+        keys = self._keys(flat)
+        key_norms = np.einsum('ij,ij->i', keys, keys)
+
+        distances = key_norms[:, None] + self.key_norms[None, :] - 2 * (keys @ self.keys.T)
+
+        shortlist = min(self.shortlist, len(self.references))
+        if shortlist < len(self.references):
+            candidates = np.argpartition(distances, shortlist - 1, axis=1)[:, :shortlist]
+        else:
+            candidates = np.tile(np.arange(len(self.references)), (len(flat), 1))
+
+        # Exact MSE re-ranking on the shortlist only
+        test_norms = np.einsum('ij,ij->i', flat, flat, dtype=np.float64)
+        mse = np.empty(candidates.shape)
+        for i, rows in enumerate(candidates):
+            sse = test_norms[i] + self.references.norms[rows] - 2 * (self.references.matrix[rows] @ flat[i])
+            mse[i] = np.maximum(sse, 0) / flat.shape[1]
+
+        return candidates, mse
+
+    def recall(self, tests):
+        """
+        Measure how often the index finds the exact nearest reference
+
+        Args:
+            tests: (N, H, W) array of test transforms
+
+        Returns:
+            Fraction of tests whose approximate best match equals the
+            exhaustive search result, or None without references
+        """
+        if not len(self.references):
+            return None
+        if not len(tests):
+            return 1.0
+
+        candidates, mse = self.search(tests)
+        approximate = candidates[np.arange(len(tests)), np.argmin(mse, axis=1)]
+        exact = np.argmin(self.references.mse(tests), axis=1)
+        return float(np.mean(approximate == exact))
+
+
+def cascade_search(references, test, levels, threshold=600):
+    """
+    Coarse-to-fine nearest-reference search over the wavelet pyramid
+
+    The layout is compared in nested top-left blocks (cA3, then caa, ca and
+    finally the full w1 layout). The squared error over a block is a lower
+    bound of the full MSE, so references whose bound already exceeds the
+    best exact match so far are pruned before the finer bands are read.
+    If every remaining bound exceeds the threshold the test is abnormal
+    whatever the remaining coefficients hold, and the search stops early
+    with only the references finished so far carrying an MSE.
+
+    Args:
+        references: ReferenceSet to search
+        test: 2D test transform with the same shape as the references
+        levels: Number of decomposition levels in the layout
+        threshold: MSE threshold for classification
+
+    Returns:
+        Tuple of (mse_values, compared): MSE per reference (None for pruned
+        references) and the fraction of reference coefficients read
+    """
+    height, width = references.shape
+    size = height * width
+    layout = references.matrix.reshape(len(references), height, width)
+    flat = test.ravel()
+    test_norm = float(flat @ flat)
+
+    mse_values = [None] * len(references)
+    survivors = np.arange(len(references))
+    partial = np.zeros(len(references))
+    best = np.inf
+    compared = 0
+    previous_h = previous_w = 0
+
+    for level in range(levels, -1, -1):
+        h, w = -(-height // 2 ** level), -(-width // 2 ** level)
+
+        # Only the ring added by this block is compared at this stage
+        for rows, cols in ((slice(0, previous_h), slice(previous_w, w)), (slice(previous_h, h), slice(0, w))):
+            diff = layout[survivors, rows, cols] - test[rows, cols]
+            partial[survivors] += np.einsum('ijk,ijk->i', diff, diff)
+            compared += diff.size
+        previous_h, previous_w = h, w
+
+        bounds = partial[survivors] / size
+
+        if level == 0:
+            for reference, mse in zip(survivors.tolist(), bounds.tolist()):
+                mse_values[reference] = mse
+            break
+
+        # Finish the most promising survivor to tighten the best-so-far
+        candidate = int(survivors[np.argmin(bounds)])
+        if mse_values[candidate] is None:
+            sse = test_norm + references.norms[candidate] - 2 * (references.matrix[candidate] @ flat)
+            mse_values[candidate] = max(float(sse), 0.0) / size
+            compared += size
+            best = min(best, mse_values[candidate])
+
+        if bounds.min() >= threshold:
+            break
+
+        survivors = survivors[bounds <= best]
+
+    return mse_values, compared / max(len(references) * size, 1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Reference Set for Brain Mapping Project
+Keeps the reference wavelet transforms as one contiguous matrix with
+precomputed squared norms so nearest-reference search is a single
+matrix product. A ReferenceSet is an immutable, versioned snapshot: it is
+built completely before being published and never modified afterwards,
+so readers can use it without locking.
+"""
+
+import copy
+import itertools
+
+import numpy as np
+
+# Every reference set gets a new version so results can be tied to it
+_versions = itertools.count(1)
+
+
+class ReferenceSet:
+    def __init__(self, transforms, dtype=np.float64, files=()):
+        """
+        Stack reference transforms into a contiguous (R, H*W) matrix
+
+        Args:
+            transforms: Sequence of equally shaped 2D wavelet transforms
+            dtype: Floating point type of the stored matrix
+            files: Source file of each reference, in matrix row order
+        """
+        transforms = list(transforms)
+        self.version = next(_versions)
+        self.files = tuple(files)
+
+        if transforms:
+            self.shape = tuple(transforms[0].shape)
+            self.matrix = np.empty((len(transforms), int(np.prod(self.shape))), dtype=dtype)
+            for i, transform in enumerate(transforms):
+                if tuple(transform.shape) != self.shape:
+                    raise ValueError(f"Reference {i} has shape {transform.shape}, expected {self.shape}")
+                self.matrix[i] = transform.ravel()
+        else:
+            self.shape = None
+            self.matrix = np.empty((0, 0), dtype=dtype)
+
+        # Squared norms are accumulated in double precision
+        self.norms = np.einsum('ij,ij->i', self.matrix, self.matrix, dtype=np.float64)
+        self._freeze()
+
+    @classmethod
+    def from_matrix(cls, matrix, shape, norms=None, files=()):
+        """
+        Wrap an existing (R, H*W) matrix without copying it
+
+        Args:
+            matrix: Reference matrix, e.g. a read-only np.memmap
+            shape: 2D shape of each reference transform
+            norms: Precomputed squared norms (computed if omitted)
+            files: Source file of each reference, in matrix row order
+
+        Returns:
+            ReferenceSet backed by the given matrix
+        """
+        references = cls.__new__(cls)
+        references.version = next(_versions)
+        references.files = tuple(files)
+        references.shape = tuple(shape) if shape is not None and len(matrix) else None
+        references.matrix = matrix
+        if norms is None:
+            norms = np.einsum('ij,ij->i', matrix, matrix, dtype=np.float64)
+        references.norms = np.array(norms, dtype=np.float64)
+        references._freeze()
+        return references
+
+    def with_files(self, files):
+        """
+        Return the same snapshot labelled with different source files
+
+        Args:
+            files: Source file of each reference, in matrix row order
+
+        Returns:
+            ReferenceSet sharing this set's matrix, norms and version
+        """
+        references = copy.copy(self)
+        references.files = tuple(files)
+        return references
+
+    def _freeze(self):
+        """Make the matrix and norms read-only so a published set cannot change"""
+        if self.matrix.flags.writeable:
+            self.matrix.flags.writeable = False
+        self.norms.flags.writeable = False
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __getitem__(self, index):
+        return self.matrix[index].reshape(self.shape)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def mse(self, tests):
+        """
+        Calculate the MSE between test transforms and every reference
+
+        Uses ||a||^2 + ||b||^2 - 2ab, so no per-reference temporaries are
+        allocated.
+
+        Args:
+            tests: (N, H, W) array of test transforms, or a single (H, W) transform
+
+        Returns:
+            (N, R) array of MSE values, or (R,) for a single transform
+        """
+        tests = np.asarray(tests)
+        single = tests.ndim == len(self.shape)
+
+        # Match the matrix precision so the product never upcasts the whole matrix
+        flat = tests.reshape(1 if single else len(tests), -1).astype(self.matrix.dtype, copy=False)
+        test_norms = np.einsum('ij,ij->i', flat, flat, dtype=np.float64)
+
+        sse = test_norms[:, None] + self.norms[None, :] - 2 * (flat @ self.matrix.T)
+
+        # Rounding can push exact matches slightly below zero
+        mse = np.maximum(sse, 0) / self.matrix.shape[1]
+        return mse[0] if single else mse
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+Result Cache for Brain Mapping Project
+Bounded LRU/TTL cache of classification results keyed by image content
+and processor configuration, and a size-bounded on-disk cache of
+rendered visualizations
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, ttl_seconds=600):
+        """
+        Initialize the result cache
+
+        Args:
+            max_entries: Maximum number of cached results (least recently used are evicted)
+            ttl_seconds: Lifetime of a cached result in seconds (None for no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reference_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(image_bytes, processor):
+        """
+        Build a key for values that depend only on the image and the transform
+
+        Args:
+            image_bytes: Encoded image content
+            processor: EEGProcessor that transforms the image
+
+        Returns:
+            Hashable key of content digest, wavelet, levels and dtype
+        """
+        return (hashlib.sha256(image_bytes).hexdigest(), processor.wavelet, processor.levels,
+                processor.dtype.name)
+
+    @staticmethod
+    def key(image_bytes, processor, threshold=None, content_key=None):
+        """
+        Build a cache key from image content and processor configuration
+
+        Args:
+            image_bytes: Encoded image content
+            processor: EEGProcessor that will classify the image
+            threshold: MSE threshold (default: processor.threshold)
+            content_key: Precomputed content_key() to avoid hashing twice
+
+        Returns:
+            Hashable cache key
+        """
+        if content_key is None:
+            content_key = ResultCache.content_key(image_bytes, processor)
+        return content_key + (processor.threshold if threshold is None else threshold,
+                              processor.search, processor.reference_version)
+
+    def sync(self, reference_version):
+        """
+        Drop every cached result when the reference set has been swapped
+
+        Args:
+            reference_version: Version of the processor's current reference set
+        """
+        with self._lock:
+            if reference_version != self.reference_version:
+                self._entries.clear()
+                self.reference_version = reference_version
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Returns:
+            A copy of the cached result dictionary, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if self.ttl_seconds is None or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        """Store a copy of a result dictionary"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class RenderCache:
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize a content-addressed cache of rendered PNG files
+
+        Args:
+            cache_dir: Directory holding the rendered files
+            max_bytes: Total size above which least recently used files are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image_bytes, processor, variant='matplotlib'):
+        """
+        Build a file name from image content and processor configuration
+
+        Args:
+            image_bytes: Encoded source image content
+            processor: EEGProcessor that renders the decomposition
+            variant: Rendering variant, so different renderers never collide
+
+        Returns:
+            File name of the rendered PNG inside the cache directory
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(f"{processor.wavelet}-{processor.levels}-{processor.dtype.name}-{variant}".encode())
+        return f"{digest.hexdigest()}.png"
+
+    def get(self, name):
+        """
+        Look up a rendered file
+
+        Returns:
+            The file name if cached (its access time is refreshed), or None
+        """
+        path = os.path.join(self.cache_dir, name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return name
+
+    def store(self, name, render):
+        """
+        Render a file into the cache and evict old files if over budget
+
+        Args:
+            name: File name returned by key()
+            render: Callable that writes the PNG to the path it is given
+
+        Returns:
+            The file name
+        """
+        # Temporary files keep the .png suffix so renderers pick the format from it
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.png', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            render(temp_path)
+            os.replace(temp_path, os.path.join(self.cache_dir, name))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.evict()
+        return name
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in max_bytes"""
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.png') and not entry.name.startswith('.tmp-'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Regression report comparing float32 and float64 classification"""
+
+import json
+import os
+import tempfile
+import numpy as np
+from eeg_processor import EEGProcessor
+from signal_generator import EEGSignalGenerator
+
+def generate_samples(data_dir, extra_samples, seed=None):
+    """Generate the standard dataset plus extra normal and abnormal test samples"""
+    abnormalities = ['high_delta', 'missing_alpha', 'high_beta']
+    abnormal_counts = {abnormality: 1 for abnormality in abnormalities}
+    for i in range(extra_samples // 2):
+        abnormal_counts[abnormalities[i % len(abnormalities)]] += 1
+    
+    generator = EEGSignalGenerator(seed=seed)
+    generator.generate_dataset(data_dir, normal_count=3 + extra_samples - extra_samples // 2,
+                               abnormal_counts=abnormal_counts)
+
+def precision_report(data_dir=None, extra_samples=20, seed=0, threshold=600):
+    """
+    Classify the generated dataset in double and single precision
+    
+    Args:
+        data_dir: Existing dataset directory (a fresh one is generated if None)
+        extra_samples: Extra test samples generated on top of the standard set
+        seed: Random seed for dataset generation
+        threshold: MSE threshold for classification
+        
+    Returns:
+        Dictionary describing decision changes and MSE deviations
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if data_dir is None:
+            data_dir = temp_dir
+            generate_samples(data_dir, extra_samples, seed)
+        
+        test_dir = os.path.join(data_dir, 'test_samples')
+        test_files = sorted(os.path.join(test_dir, f) for f in os.listdir(test_dir) if f.endswith('.png'))
+        
+        results = {}
+        matrix_bytes = {}
+        for dtype in (np.float64, np.float32):
+            processor = EEGProcessor(threshold=threshold, dtype=dtype)
+            processor.load_reference_database(os.path.join(data_dir, 'reference_signals'))
+            results[np.dtype(dtype).name] = processor.classify_batch(test_files)
+            matrix_bytes[np.dtype(dtype).name] = processor.reference_transforms.matrix.nbytes
+    
+    changed = []
+    mse_differences = []
+    for path, double, single in zip(test_files, results['float64'], results['float32']):
+        difference = abs(single['min_mse'] - double['min_mse'])
+        mse_differences.append(difference)
+        if (single['classification'], single['matched_frame']) != (double['classification'], double['matched_frame']):
+            changed.append({
+                'sample': os.path.basename(path),
+                'float64': double['classification'],
+                'float32': single['classification'],
+                'min_mse': double['min_mse']
+            })
+    
+    return {
+        'samples': len(test_files),
+        'decisions_changed': changed,
+        'max_abs_mse_difference': max(mse_differences, default=0.0),
+        'max_rel_mse_difference': max((d / max(r['min_mse'], 1e-12) for d, r in
+                                       zip(mse_differences, results['float64'])), default=0.0),
+        'closest_margin_to_threshold': min((abs(r['min_mse'] - threshold) for r in results['float64']),
+                                           default=None),
+        'reference_matrix_bytes': matrix_bytes
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare float32 and float64 classification decisions")
+    parser.add_argument("--data-dir", help="Existing dataset directory (default: generate a fresh one)")
+    parser.add_argument("--extra-samples", type=int, default=20, help="Extra generated test samples")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for dataset generation")
+    parser.add_argument("--threshold", type=float, default=600, help="MSE classification threshold")
+    
+    args = parser.parse_args()
+    
+    report = precision_report(args.data_dir, args.extra_samples, args.seed, args.threshold)
+    print(json.dumps(report, indent=2))
+    
+    raise SystemExit(1 if report['decisions_changed'] else 0)
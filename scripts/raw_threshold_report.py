@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Calibration report for the raw-mode classification threshold"""
+
+import json
+import numpy as np
+from eeg_processor import EEGProcessor
+from signal_generator import ABNORMALITY_TYPES, EEGSignalGenerator
+from spectrogram import RAW_THRESHOLD
+
+def min_mse_by_kind(processor, generator, reference_count, samples_per_kind):
+    """
+    Classify generated raw-mode spectrograms against generated raw-mode references
+
+    Returns:
+        Dictionary mapping 'normal' and each abnormality type to an array of min MSE values
+    """
+    processor.load_reference_images(generator.batch_to_spectrograms(generator.generate_batch(reference_count, 'normal')))
+
+    min_mse = {}
+    for kind in ('normal',) + ABNORMALITY_TYPES:
+        images = generator.batch_to_spectrograms(generator.generate_batch(samples_per_kind, kind))
+        results = processor.classify_batch([image.astype(processor.dtype) for image in images])
+        min_mse[kind] = np.array([result['min_mse'] for result in results])
+    return min_mse
+
+def rates_at(min_mse, threshold):
+    """Share of each kind classified correctly at a threshold, plus the balanced accuracy"""
+    rates = {kind: float(np.mean(values <= threshold if kind == 'normal' else values > threshold))
+             for kind, values in min_mse.items()}
+    abnormal = np.concatenate([values for kind, values in min_mse.items() if kind != 'normal'])
+    rates['balanced_accuracy'] = (rates['normal'] + float(np.mean(abnormal > threshold))) / 2
+    return rates
+
+def raw_threshold_report(threshold=RAW_THRESHOLD, seeds=(0, 1, 2, 3), reference_count=5, samples_per_kind=40):
+    """
+    Measure how well raw-mode spectrograms separate normal from abnormal EEG
+
+    Args:
+        threshold: MSE threshold to evaluate
+        seeds: One generated reference set and test set per seed
+        reference_count: Normal reference patterns per seed
+        samples_per_kind: Test signals per kind and seed
+
+    Returns:
+        Dictionary with min MSE percentiles per kind, the accuracy at the
+        threshold and the best threshold on the same data
+    """
+    processor = EEGProcessor(threshold=threshold)
+    runs = [min_mse_by_kind(processor, EEGSignalGenerator(seed=seed), reference_count, samples_per_kind)
+            for seed in seeds]
+    min_mse = {kind: np.concatenate([run[kind] for run in runs]) for kind in runs[0]}
+
+    candidates = np.unique(np.concatenate(list(min_mse.values())))
+    best = max(candidates, key=lambda candidate: rates_at(min_mse, candidate)['balanced_accuracy'])
+
+    return {
+        'samples_per_kind': len(seeds) * samples_per_kind,
+        'min_mse_percentiles': {kind: dict(zip(('p10', 'p50', 'p90'), np.percentile(values, [10, 50, 90]).tolist()))
+                                for kind, values in min_mse.items()},
+        'threshold': threshold,
+        'at_threshold': rates_at(min_mse, threshold),
+        'best_threshold': float(best),
+        'at_best_threshold': rates_at(min_mse, best)
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the raw-mode MSE threshold against generated signals")
+    parser.add_argument("--threshold", type=float, default=RAW_THRESHOLD, help="MSE classification threshold")
+    parser.add_argument("--seeds", type=int, nargs='+', default=[0, 1, 2, 3], help="Seeds of the generated sets")
+    parser.add_argument("--samples", type=int, default=40, help="Test signals per kind and seed")
+    parser.add_argument("--min-accuracy", type=float, default=0.85,
+                        help="Fail if the balanced accuracy at the threshold is lower")
+
+    args = parser.parse_args()
+
+    report = raw_threshold_report(args.threshold, args.seeds, samples_per_kind=args.samples)
+    print(json.dumps(report, indent=2))
+
+    raise SystemExit(1 if report['at_threshold']['balanced_accuracy'] < args.min_accuracy else 0)
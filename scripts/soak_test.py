@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Soak test feeding a synthetic EEG stream to the classifier or the HTTP API"""
+
+import json
+import resource
+import time
+import urllib.request
+import uuid
+
+import numpy as np
+from eeg_processor import EEGProcessor
+from signal_generator import EEGSignalGenerator
+from spectrogram import RAW_THRESHOLD
+
+def post_image(url, image_bytes, timeout=30):
+    """POST encoded image bytes to /upload as a multipart form"""
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="window.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n').encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def build_processor(reference_dir=None, reference_count=5, threshold=RAW_THRESHOLD, seed=0):
+    """
+    Create a processor with references from a directory, or from raw stream windows
+
+    Streamed windows are raw spectrogram arrays, so without a reference
+    directory the references are generated the same way.
+    """
+    processor = EEGProcessor(threshold=threshold, raw_threshold=threshold)
+    if reference_dir:
+        processor.load_reference_database(reference_dir)
+    else:
+        generator = EEGSignalGenerator(seed=seed)
+        processor.load_reference_images(generator.batch_to_spectrograms(generator.generate_batch(reference_count, 'normal')))
+    return processor
+
+def soak_test(duration=60, rate=None, abnormal_fraction=0.5, url=None, reference_dir=None,
+              threshold=RAW_THRESHOLD, seed=0, report_every=10):
+    """
+    Classify a synthetic stream for a fixed time and summarize the run
+
+    Args:
+        duration: Seconds to run
+        rate: Windows per second (None for as fast as possible)
+        abnormal_fraction: Share of abnormal windows in the stream
+        url: /upload URL of a running server (classifies in process if None);
+             windows are raw-mode PNGs, so accuracy is only meaningful if
+             the server uses raw-mode references and threshold
+        reference_dir: Reference images for in-process classification
+        threshold: MSE threshold for in-process classification (the
+                   streamed windows are raw-mode images)
+        seed: Seed for the stream
+        report_every: Seconds between progress lines
+
+    Returns:
+        Dictionary with throughput, latency percentiles, accuracy and errors
+    """
+    processor = None if url else build_processor(reference_dir, threshold=threshold, seed=seed)
+    generator = EEGSignalGenerator(seed=seed + 1)
+    stream = generator.stream(output='png' if url else 'spectrogram', rate=rate,
+                              abnormal_fraction=abnormal_fraction)
+
+    latencies = []
+    correct = errors = 0
+    started = last_report = time.perf_counter()
+    for window in stream:
+        if time.perf_counter() - started >= duration:
+            break
+
+        request_started = time.perf_counter()
+        try:
+            if url:
+                result = post_image(url, window['data'])
+            else:
+                result = processor.classify_image(window['data'].astype(np.float64))
+        except Exception as e:
+            result = {'error': str(e)}
+        latencies.append(time.perf_counter() - request_started)
+
+        if 'error' in result:
+            errors += 1
+        elif result['classification'] == window['label']:
+            correct += 1
+
+        if time.perf_counter() - last_report >= report_every:
+            last_report = time.perf_counter()
+            print(f"{len(latencies)} windows, {errors} errors, "
+                  f"p95 latency {np.percentile(latencies, 95) * 1000:.1f} ms")
+
+    elapsed = time.perf_counter() - started
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'target': url or 'in-process',
+        'windows': len(latencies),
+        'elapsed_seconds': elapsed,
+        'windows_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p95': float(np.percentile(latencies_ms, 95)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'max': float(latencies_ms.max())
+        },
+        'accuracy': correct / max(len(latencies) - errors, 1),
+        'errors': errors,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Feed a synthetic EEG stream to the classifier")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+    parser.add_argument("--rate", type=float, help="Windows per second (default: as fast as possible)")
+    parser.add_argument("--abnormal-fraction", type=float, default=0.5, help="Share of abnormal windows")
+    parser.add_argument("--url", help="Upload URL of a running server, e.g. http://localhost:3000/upload")
+    parser.add_argument("--reference-dir", help="Reference images for in-process classification")
+    parser.add_argument("--threshold", type=float, default=RAW_THRESHOLD, help="MSE classification threshold")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the stream")
+
+    args = parser.parse_args()
+    summary = soak_test(args.duration, args.rate, args.abnormal_fraction, args.url,
+                        args.reference_dir, args.threshold, args.seed)
+    print(json.dumps(summary, indent=2))
@@ -8,21 +8,68 @@ Based on 2013 Brain Mapping using MATLAB Technology project
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
-from scipy import signal
+from matplotlib.figure import Figure
+import io
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+from spectrogram import compute_spectrogram, spectrogram_to_image
+
+ABNORMALITY_TYPES = ('high_delta', 'missing_alpha', 'high_beta')
+
+# (band, amplitude, noise level) of each component, per signal kind
+PROFILES = {
+    # Normal EEG characteristics:
+    # - Moderate alpha waves (relaxed state)
+    # - Some beta waves (active thinking)
+    # - Low delta waves (should be minimal in awake state)
+    # - Some theta waves
+    'normal': (('alpha', 2.0, 0.2), ('beta', 1.5, 0.15), ('theta', 1.0, 0.1), ('delta', 0.5, 0.05)),
+    # Excessive delta waves - often indicates brain damage or deep sleep
+    'high_delta': (('delta', 4.0, 0.3), ('theta', 2.0, 0.2), ('alpha', 0.5, 0.1), ('beta', 0.8, 0.1)),
+    # Missing alpha waves - can indicate various neurological conditions
+    'missing_alpha': (('beta', 2.5, 0.2), ('theta', 1.8, 0.15), ('delta', 1.0, 0.1), ('alpha', 0.2, 0.05)),
+    # Excessive beta waves - anxiety, stimulants, or certain medications
+    'high_beta': (('beta', 4.0, 0.3), ('alpha', 1.0, 0.1), ('theta', 0.8, 0.1), ('delta', 0.3, 0.05))
+}
+
+
+def _generate_sample(task):
+    """
+    Generate one spectrogram image; runs in a worker process
+    
+    Args:
+        task: Tuple of (fs, duration, kind, abnormality_type, seed, save_path, raw)
+              where kind is 'normal' or 'abnormal' and seed is a SeedSequence
+    
+    Returns:
+        The save path
+    """
+    fs, duration, kind, abnormality_type, seed, save_path, raw = task
+    generator = EEGSignalGenerator(fs=fs, duration=duration, seed=seed)
+    if kind == 'normal':
+        eeg_signal = generator.generate_normal_eeg()
+    else:
+        eeg_signal = generator.generate_abnormal_eeg(abnormality_type)
+    generator.signal_to_spectrogram(eeg_signal, save_path, raw=raw)
+    return save_path
+
 
 class EEGSignalGenerator:
-    def __init__(self, fs=256, duration=10):
+    def __init__(self, fs=256, duration=10, seed=None):
         """
         Initialize EEG Signal Generator
         
         Args:
             fs: Sampling frequency (Hz) - typical EEG sampling rate
             duration: Signal duration in seconds
+            seed: Seed (int or np.random.SeedSequence) for reproducible signals
         """
         self.fs = fs
         self.duration = duration
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
         self.t = np.linspace(0, duration, fs * duration)
         
         # EEG frequency bands (Hz)
@@ -44,39 +91,26 @@ class EEGSignalGenerator:
             noise_level: Noise level to add
         """
         # Random frequency within the range
-        freq = np.random.uniform(freq_range[0], freq_range[1])
+        freq = self.rng.uniform(freq_range[0], freq_range[1])
         
         # Generate sine wave with some phase variation
-        phase = np.random.uniform(0, 2 * np.pi)
+        phase = self.rng.uniform(0, 2 * np.pi)
         wave = amplitude * np.sin(2 * np.pi * freq * self.t + phase)
         
         # Add some amplitude modulation for realism
-        modulation_freq = np.random.uniform(0.1, 0.5)
+        modulation_freq = self.rng.uniform(0.1, 0.5)
         modulation = 0.3 * np.sin(2 * np.pi * modulation_freq * self.t)
         wave = wave * (1 + modulation)
         
         # Add noise
-        noise = noise_level * np.random.randn(len(self.t))
+        noise = noise_level * self.rng.standard_normal(len(self.t))
         return wave + noise
     
     def generate_normal_eeg(self):
         """
         Generate a normal EEG signal with typical frequency distribution
         """
-        eeg_signal = np.zeros(len(self.t))
-        
-        # Normal EEG characteristics:
-        # - Moderate alpha waves (relaxed state)
-        # - Some beta waves (active thinking)
-        # - Low delta waves (should be minimal in awake state)
-        # - Some theta waves
-        
-        eeg_signal += self.generate_brain_wave(self.bands['alpha'], amplitude=2.0, noise_level=0.2)
-        eeg_signal += self.generate_brain_wave(self.bands['beta'], amplitude=1.5, noise_level=0.15)
-        eeg_signal += self.generate_brain_wave(self.bands['theta'], amplitude=1.0, noise_level=0.1)
-        eeg_signal += self.generate_brain_wave(self.bands['delta'], amplitude=0.5, noise_level=0.05)
-        
-        return eeg_signal
+        return self._generate_profile('normal')
     
     def generate_abnormal_eeg(self, abnormality_type='high_delta'):
         """
@@ -88,72 +122,173 @@ class EEGSignalGenerator:
                 - 'missing_alpha': Missing or reduced alpha waves
                 - 'high_beta': Excessive beta waves (anxiety, medication effects)
         """
+        if abnormality_type not in ABNORMALITY_TYPES:
+            return np.zeros(len(self.t))
+        return self._generate_profile(abnormality_type)
+    
+    def _generate_profile(self, kind):
+        """Sum one brain wave per component of a PROFILES entry"""
         eeg_signal = np.zeros(len(self.t))
+        for band, amplitude, noise_level in PROFILES[kind]:
+            eeg_signal += self.generate_brain_wave(self.bands[band], amplitude=amplitude, noise_level=noise_level)
+        return eeg_signal
+    
+    def generate_batch(self, count, kind='normal'):
+        """
+        Generate many EEG signals of one kind with a few vectorized draws
+        
+        Frequencies, phases and modulation of all signals are drawn at
+        once and the waves are built by broadcasting over (count, samples).
+        The independent per-component noise terms are combined into a
+        single Gaussian draw with the same total variance.
+        
+        Args:
+            count: Number of signals
+            kind: 'normal' or one of the abnormality types
+            
+        Returns:
+            (count, fs * duration) array of signals
+        """
+        if kind not in PROFILES:
+            raise ValueError(f"Unknown signal kind: {kind}")
+        
+        profile = PROFILES[kind]
+        low = np.array([self.bands[band][0] for band, _, _ in profile])
+        high = np.array([self.bands[band][1] for band, _, _ in profile])
+        
+        freqs = self.rng.uniform(low, high, size=(count, len(profile)))
+        phases = self.rng.uniform(0, 2 * np.pi, size=(count, len(profile)))
+        modulation_freqs = self.rng.uniform(0.1, 0.5, size=(count, len(profile)))
+        
+        # Accumulate one component at a time so memory stays at (count, samples)
+        omega_t = 2 * np.pi * self.t
+        signals = np.zeros((count, len(self.t)))
+        for c, (_, amplitude, _) in enumerate(profile):
+            wave = np.sin(freqs[:, c, None] * omega_t + phases[:, c, None])
+            wave *= 1 + 0.3 * np.sin(modulation_freqs[:, c, None] * omega_t)
+            signals += amplitude * wave
+        
+        noise_level = np.sqrt(sum(noise ** 2 for _, _, noise in profile))
+        signals += noise_level * self.rng.standard_normal(signals.shape)
+        return signals
+    
+    def batch_to_spectrograms(self, signals):
+        """
+        Convert stacked signals to spectrogram images
         
-        if abnormality_type == 'high_delta':
-            # Excessive delta waves - often indicates brain damage or deep sleep
-            eeg_signal += self.generate_brain_wave(self.bands['delta'], amplitude=4.0, noise_level=0.3)
-            eeg_signal += self.generate_brain_wave(self.bands['theta'], amplitude=2.0, noise_level=0.2)
-            eeg_signal += self.generate_brain_wave(self.bands['alpha'], amplitude=0.5, noise_level=0.1)
-            eeg_signal += self.generate_brain_wave(self.bands['beta'], amplitude=0.8, noise_level=0.1)
+        All spectrograms come from one scipy.signal.spectrogram call along
+        the last axis. The images are then mapped one at a time, which keeps
+        the 256x256 float intermediates in cache and measured faster than
+        mapping the whole stack at once.
+        
+        Args:
+            signals: (K, N) array of EEG signals
             
-        elif abnormality_type == 'missing_alpha':
-            # Missing alpha waves - can indicate various neurological conditions
-            eeg_signal += self.generate_brain_wave(self.bands['beta'], amplitude=2.5, noise_level=0.2)
-            eeg_signal += self.generate_brain_wave(self.bands['theta'], amplitude=1.8, noise_level=0.15)
-            eeg_signal += self.generate_brain_wave(self.bands['delta'], amplitude=1.0, noise_level=0.1)
-            # Minimal alpha
-            eeg_signal += self.generate_brain_wave(self.bands['alpha'], amplitude=0.2, noise_level=0.05)
+        Returns:
+            (K, 256, 256) uint8 array, as signal_to_spectrogram(raw=True)
+        """
+        _, _, Sxx_db = compute_spectrogram(signals, self.fs)
+        images = np.empty((len(Sxx_db), 256, 256), dtype=np.uint8)
+        for i, spectrogram in enumerate(Sxx_db):
+            images[i] = spectrogram_to_image(spectrogram)
+        return images
+    
+    def stream(self, output='signal', rate=None, abnormal_fraction=0.5, abnormality_types=ABNORMALITY_TYPES,
+               batch_size=32, limit=None):
+        """
+        Yield an endless sequence of labelled synthetic EEG windows
+        
+        Windows are generated batch_size at a time with generate_batch, so
+        memory stays bounded however long the stream runs.
+        
+        Args:
+            output: 'signal' for raw samples, 'spectrogram' for the 256x256
+                    uint8 image array, or 'png' for encoded image bytes that
+                    can be posted to the HTTP API
+            rate: Windows per second (None yields as fast as possible)
+            abnormal_fraction: Probability that a window is abnormal
+            abnormality_types: Abnormality types drawn uniformly for abnormal windows
+            batch_size: Number of windows generated per batch
+            limit: Stop after this many windows (None streams forever)
             
-        elif abnormality_type == 'high_beta':
-            # Excessive beta waves - anxiety, stimulants, or certain medications
-            eeg_signal += self.generate_brain_wave(self.bands['beta'], amplitude=4.0, noise_level=0.3)
-            eeg_signal += self.generate_brain_wave(self.bands['alpha'], amplitude=1.0, noise_level=0.1)
-            eeg_signal += self.generate_brain_wave(self.bands['theta'], amplitude=0.8, noise_level=0.1)
-            eeg_signal += self.generate_brain_wave(self.bands['delta'], amplitude=0.3, noise_level=0.05)
+        Yields:
+            Dictionaries with 'index', 'label' ('Normal' or 'Abnormal'),
+            'kind' (profile name) and 'data'
+        """
+        if output not in ('signal', 'spectrogram', 'png'):
+            raise ValueError(f"Unknown stream output: {output}")
+        unknown = set(abnormality_types) - set(ABNORMALITY_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown abnormality types: {sorted(unknown)}")
         
-        return eeg_signal
+        index = 0
+        started = time.perf_counter()
+        while limit is None or index < limit:
+            size = batch_size if limit is None else min(batch_size, limit - index)
+            abnormal = self.rng.random(size) < abnormal_fraction
+            kinds = np.where(abnormal, self.rng.choice(list(abnormality_types) or ['normal'], size), 'normal')
+            
+            # One vectorized draw per kind, then back into the drawn order
+            signals = np.empty((size, len(self.t)))
+            for kind in np.unique(kinds):
+                rows = np.flatnonzero(kinds == kind)
+                signals[rows] = self.generate_batch(len(rows), str(kind))
+            data = signals if output == 'signal' else self.batch_to_spectrograms(signals)
+            
+            for kind, window in zip(kinds.tolist(), data):
+                if rate:
+                    # Pace against the start time so delays do not accumulate
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if output == 'png':
+                    buffer = io.BytesIO()
+                    Image.fromarray(window).save(buffer, format='PNG')
+                    window = buffer.getvalue()
+                yield {
+                    'index': index,
+                    'label': 'Normal' if kind == 'normal' else 'Abnormal',
+                    'kind': kind,
+                    'data': window
+                }
+                index += 1
     
-    def signal_to_spectrogram(self, eeg_signal, save_path=None):
+    def signal_to_spectrogram(self, eeg_signal, save_path=None, raw=False):
         """
         Convert EEG signal to spectrogram image
         
         Args:
             eeg_signal: 1D EEG signal
             save_path: Path to save the spectrogram image
+            raw: Map the spectrogram straight to a 256x256 grayscale array
+                 instead of drawing a figure; the image has no axes, title
+                 or colorbar, so references and test samples must be
+                 generated in the same mode and classified with
+                 spectrogram.RAW_THRESHOLD
         
         Returns:
-            2D spectrogram data
-        """
-        # Compute spectrogram
-        nperseg = 128  # Window size
-        noverlap = 64  # Overlap
-        
-        f, t, Sxx = signal.spectrogram(eeg_signal, 
-                                     fs=self.fs, 
-                                     window='hann',
-                                     nperseg=nperseg, 
-                                     noverlap=noverlap)
-        
-        # Limit frequency range to typical EEG range (0-50 Hz)
-        freq_mask = f <= 50
-        f = f[freq_mask]
-        Sxx = Sxx[freq_mask, :]
-        
-        # Convert to dB scale
-        Sxx_db = 10 * np.log10(Sxx + 1e-10)
-        
-        # Create the plot
-        plt.figure(figsize=(8, 6))
-        plt.pcolormesh(t, f, Sxx_db, shading='gouraud', cmap='gray')
-        plt.ylabel('Frequency [Hz]')
-        plt.xlabel('Time [sec]')
-        plt.title('EEG Spectrogram')
-        plt.colorbar(label='Power/Frequency (dB/Hz)')
+            2D spectrogram data, or the 256x256 uint8 image in raw mode
+        """
+        f, t, Sxx_db = compute_spectrogram(eeg_signal, self.fs)
+        
+        if raw:
+            image = spectrogram_to_image(Sxx_db)
+            if save_path:
+                Image.fromarray(image).save(save_path)
+            return image
+        
+        # Create the plot; saved figures bypass pyplot's global state so
+        # spectrograms can be rendered from several threads
+        fig = Figure(figsize=(8, 6)) if save_path else plt.figure(figsize=(8, 6))
+        ax = fig.add_subplot()
+        mesh = ax.pcolormesh(t, f, Sxx_db, shading='gouraud', cmap='gray')
+        ax.set_ylabel('Frequency [Hz]')
+        ax.set_xlabel('Time [sec]')
+        ax.set_title('EEG Spectrogram')
+        fig.colorbar(mesh, ax=ax, label='Power/Frequency (dB/Hz)')
         
         if save_path:
-            plt.savefig(save_path, dpi=100, bbox_inches='tight')
-            plt.close()
+            fig.savefig(save_path, dpi=100, bbox_inches='tight')
             
             # Convert to grayscale and resize to 256x256 as per original project
             img = Image.open(save_path)
@@ -165,10 +300,30 @@ class EEGSignalGenerator:
         
         return Sxx_db
     
-    def generate_dataset(self, output_dir):
+    def generate_dataset(self, output_dir, reference_count=5, normal_count=3, abnormal_counts=None,
+                         workers=None, seed=None, raw=False):
         """
         Generate a complete dataset of normal and abnormal EEG patterns
+        
+        Every sample gets its own seed spawned from one SeedSequence, so the
+        output only depends on the seed, never on the number of workers.
+        
+        Args:
+            output_dir: Directory receiving reference_signals/ and test_samples/
+            reference_count: Number of normal reference patterns
+            normal_count: Number of normal test samples
+            abnormal_counts: Number of abnormal test samples per abnormality
+                             type (default: one of each type)
+            workers: Number of worker processes (None or 1 generates serially)
+            seed: Seed for the whole dataset (default: the generator's seed)
+            raw: Write raw spectrogram arrays instead of rendered figures
         """
+        if abnormal_counts is None:
+            abnormal_counts = {abnormality: 1 for abnormality in ABNORMALITY_TYPES}
+        unknown = set(abnormal_counts) - set(ABNORMALITY_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown abnormality types: {sorted(unknown)}")
+        
         # Ensure output directories exist
         normal_dir = os.path.join(output_dir, 'reference_signals')
         test_dir = os.path.join(output_dir, 'test_samples')
@@ -176,35 +331,34 @@ class EEGSignalGenerator:
         os.makedirs(normal_dir, exist_ok=True)
         os.makedirs(test_dir, exist_ok=True)
         
-        print("Generating reference (normal) EEG patterns...")
-        # Generate 5 normal reference patterns (as per original project)
-        for i in range(5):
-            eeg_signal = self.generate_normal_eeg()
-            save_path = os.path.join(normal_dir, f'eeg{i+1}n.png')
-            self.signal_to_spectrogram(eeg_signal, save_path)
-            print(f"Generated normal pattern {i+1}")
-        
-        print("\nGenerating test samples...")
-        # Generate 3 normal test samples
-        for i in range(3):
-            eeg_signal = self.generate_normal_eeg()
-            save_path = os.path.join(test_dir, f'test_normal_{i+1}.png')
-            self.signal_to_spectrogram(eeg_signal, save_path)
-            print(f"Generated normal test sample {i+1}")
-        
-        # Generate 3 abnormal test samples
-        abnormalities = ['high_delta', 'missing_alpha', 'high_beta']
-        for i, abnormality in enumerate(abnormalities):
-            eeg_signal = self.generate_abnormal_eeg(abnormality)
-            save_path = os.path.join(test_dir, f'test_abnormal_{abnormality}.png')
-            self.signal_to_spectrogram(eeg_signal, save_path)
-            print(f"Generated abnormal test sample: {abnormality}")
+        # Normal reference patterns (5 as per original project), then test samples
+        samples = [('normal', None, os.path.join(normal_dir, f'eeg{i+1}n.png')) for i in range(reference_count)]
+        samples += [('normal', None, os.path.join(test_dir, f'test_normal_{i+1}.png')) for i in range(normal_count)]
+        for abnormality, count in abnormal_counts.items():
+            for i in range(count):
+                # A single sample per type keeps the original file name
+                suffix = abnormality if count == 1 else f'{abnormality}_{i+1}'
+                samples.append(('abnormal', abnormality, os.path.join(test_dir, f'test_abnormal_{suffix}.png')))
+        
+        seed = self.seed if seed is None else seed
+        seeds = np.random.SeedSequence(seed).spawn(len(samples))
+        tasks = [(self.fs, self.duration, kind, abnormality, sample_seed, save_path, raw)
+                 for (kind, abnormality, save_path), sample_seed in zip(samples, seeds)]
+        
+        print(f"Generating {reference_count} reference patterns and {len(tasks) - reference_count} test samples...")
+        if workers is None or workers <= 1:
+            for save_path in map(_generate_sample, tasks):
+                print(f"Generated {os.path.basename(save_path)}")
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                for save_path in executor.map(_generate_sample, tasks, chunksize=chunksize):
+                    print(f"Generated {os.path.basename(save_path)}")
         
         print(f"\nDataset generation complete!")
         print(f"Reference patterns saved to: {normal_dir}")
         print(f"Test samples saved to: {test_dir}")
 
-
 if __name__ == "__main__":
     # Generate the dataset
     generator = EEGSignalGenerator()
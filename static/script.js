@@ -282,21 +282,35 @@ function displayProcessedImage(imagePath) {
 function generateData() {
     showLoading();
     
-    $.get('/generate_data')
-        .done(function(data) {
-            hideLoading();
-            alert('Dataset generated successfully! ' + data.reference_count + ' reference patterns loaded.');
-            location.reload(); // Reload to show new test samples
+    var fail = function(xhr) {
+        hideLoading();
+        var error = 'Data generation failed';
+        try {
+            var response = JSON.parse(xhr.responseText);
+            error = response.error || error;
+        } catch(e) {}
+        alert('Error: ' + error);
+    };
+    
+    // Generation runs as a background job; poll until its result is ready
+    $.post('/jobs/generate_data')
+        .done(function(job) {
+            var poll = function() {
+                $.get('/jobs/' + job.job_id + '/result')
+                    .done(function(data, status, xhr) {
+                        if (xhr.status === 202) {
+                            setTimeout(poll, 1000);
+                            return;
+                        }
+                        hideLoading();
+                        alert('Dataset generated successfully! ' + data.reference_count + ' reference patterns loaded.');
+                        location.reload(); // Reload to show new test samples
+                    })
+                    .fail(fail);
+            };
+            poll();
         })
-        .fail(function(xhr) {
-            hideLoading();
-            var error = 'Data generation failed';
-            try {
-                var response = JSON.parse(xhr.responseText);
-                error = response.error || error;
-            } catch(e) {}
-            alert('Error: ' + error);
-        });
+        .fail(fail);
 }
 
 function showLoading() {
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Streaming Classifier for Brain Mapping Project
+Classifies continuous EEG recordings chunk by chunk, keeping a rolling
+spectrogram that is extended one STFT column per hop instead of being
+recomputed over the whole window
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from spectrogram import spectrogram_to_image
+
+
+class StreamingClassifier:
+    def __init__(self, processor, fs=256, window_seconds=10, nperseg=128, noverlap=64, max_freq=50,
+                 threshold=None, batch_size=64):
+        """
+        Initialize a sliding-window classifier for one recording
+
+        The STFT parameters match signal_to_spectrogram, so once the window
+        is full the rolling spectrogram equals scipy.signal.spectrogram over
+        the most recent window_seconds of samples.
+
+        Args:
+            processor: EEGProcessor with references loaded (may be shared
+                       between recordings)
+            fs: Sampling frequency (Hz)
+            window_seconds: Length of the classified window in seconds
+            nperseg: STFT segment length
+            noverlap: Overlap between segments
+            max_freq: Highest frequency kept (Hz)
+            threshold: MSE threshold for classification (default: the
+                       processor's raw_threshold, as windows are raw-mode images)
+            batch_size: Hops transformed and classified together; bounds the
+                        images held at once however long a pushed chunk is
+        """
+        window_samples = int(fs * window_seconds)
+        if window_samples < nperseg:
+            raise ValueError(f"Window of {window_samples} samples is shorter than one segment ({nperseg})")
+
+        self.processor = processor
+        self.fs = fs
+        self.nperseg = nperseg
+        self.hop = nperseg - noverlap
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.columns = (window_samples - noverlap) // self.hop
+
+        # Same window and density scaling as scipy.signal.spectrogram
+        self.window = signal.get_window('hann', nperseg)
+        self.scale = 1.0 / (fs * np.sum(self.window ** 2))
+        freqs = np.fft.rfftfreq(nperseg, 1.0 / fs)
+        self.freq_mask = freqs <= max_freq
+
+        # One-sided spectrum: every bin but DC (and Nyquist for even lengths) is doubled
+        self.doubling = np.full(len(freqs), 2.0)
+        self.doubling[0] = 1.0
+        if nperseg % 2 == 0:
+            self.doubling[-1] = 1.0
+        self.doubling = self.doubling[self.freq_mask]
+
+        self.reset()
+
+    def reset(self):
+        """Forget all samples, e.g. when a new recording starts"""
+        self.pending = np.empty(0)
+        self.ring = np.empty((int(self.freq_mask.sum()), self.columns))
+        self.filled = 0
+        self.next_column = 0
+        self.samples_seen = 0
+
+    @property
+    def ready(self):
+        """Whether the rolling spectrogram covers a full window"""
+        return self.filled >= self.columns
+
+    @property
+    def spectrogram(self):
+        """Rolling spectrogram in dB, oldest column first"""
+        if not self.ready:
+            return self.ring[:, :self.filled].copy()
+        return np.roll(self.ring, -self.next_column, axis=1)
+
+    def _stft_columns(self, segments):
+        """
+        Compute dB spectrogram columns for (K, nperseg) segments
+
+        Returns:
+            (F, K) array of columns
+        """
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(segments * self.window, axis=1)[:, self.freq_mask]
+        power = (spectrum.real ** 2 + spectrum.imag ** 2) * self.scale * self.doubling
+        return (10 * np.log10(power + 1e-10)).T
+
+    def push(self, samples):
+        """
+        Add a chunk of samples and classify every completed hop
+
+        Completed hops are processed batch_size at a time: their STFT
+        columns are computed, the windows they complete are mapped to
+        images and classified before the next group starts, so memory does
+        not grow with the chunk length. The samples kept between calls are
+        fewer than one segment.
+
+        Args:
+            samples: 1D array of new samples (any length)
+
+        Returns:
+            List of result dictionaries, one per hop completed while the
+            window is full, each with 'sample_index' and 'time' of the
+            window end
+        """
+        buffer = np.concatenate([self.pending, np.asarray(samples, dtype=np.float64).ravel()])
+        count = (len(buffer) - self.nperseg) // self.hop + 1 if len(buffer) >= self.nperseg else 0
+        buffer_start = self.samples_seen - len(self.pending)
+        segments = sliding_window_view(buffer, self.nperseg)[::self.hop] if count else None
+        threshold = self.processor.raw_threshold if self.threshold is None else self.threshold
+
+        results = []
+        for start in range(0, count, self.batch_size):
+            stop = min(start + self.batch_size, count)
+            columns = self._stft_columns(segments[start:stop])
+            images = []
+            ends = []
+            for k in range(start, stop):
+                self.ring[:, self.next_column] = columns[:, k - start]
+                self.next_column = (self.next_column + 1) % self.columns
+                self.filled = min(self.filled + 1, self.columns)
+                if self.ready:
+                    images.append(spectrogram_to_image(self.spectrogram).astype(self.processor.dtype))
+                    ends.append(buffer_start + k * self.hop + self.nperseg)
+
+            if images:
+                batch = self.processor.classify_batch(images, threshold=threshold, batch_size=self.batch_size)
+                for result, end in zip(batch, ends):
+                    result['sample_index'] = end
+                    result['time'] = end / self.fs
+                results.extend(batch)
+
+        self.samples_seen += len(buffer) - len(self.pending)
+        self.pending = buffer[count * self.hop:]
+        return results
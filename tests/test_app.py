@@ -2,9 +2,29 @@
 """Unit tests for Flask application"""
 
 import pytest
+import io
 import json
+import numpy as np
+from unittest.mock import patch
+from PIL import Image
+import app as app_module
 from app import app
 
+def _png_bytes(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def reference_pixels():
+    """Random image installed as the app processor's only reference, restored afterwards"""
+    pixels = np.random.randint(0, 256, (256, 256), dtype=np.uint8)
+    processor = app_module.processor
+    saved_references = processor.reference_transforms
+    processor.load_reference_images([pixels])
+    yield pixels
+    processor.reference_transforms = saved_references
+
 class TestFlaskApp:
     def setup_method(self):
         self.app = app.test_client()
@@ -19,6 +39,223 @@ class TestFlaskApp:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert 'wavelet_type' in data
+    
+    def test_upload_classifies_in_memory(self, reference_pixels):
+        pixels = reference_pixels
+        with patch('werkzeug.datastructures.FileStorage.save') as mock_save, \
+             patch('os.remove') as mock_remove:
+            response = self.app.post('/upload', data={
+                'file': (io.BytesIO(_png_bytes(pixels)), 'sample.png')
+            }, content_type='multipart/form-data')
+            mock_save.assert_not_called()
+            mock_remove.assert_not_called()
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['classification'] == 'Normal'
+        assert data['uploaded_filename'] == 'sample.png'
+        assert data['test_image'] == 'sample.png'
+
+    def test_repeat_upload_served_from_cache(self, reference_pixels):
+        pixels = reference_pixels
+        processor = app_module.processor
+        
+        def upload():
+            return self.app.post('/upload', data={
+                'file': (io.BytesIO(_png_bytes(pixels)), 'sample.png')
+            }, content_type='multipart/form-data')
+        
+        first = json.loads(upload().data)
+        with patch.object(processor, 'classify_image') as mock_classify:
+            second = json.loads(upload().data)
+            mock_classify.assert_not_called()
+        assert second == first
+        
+        # Swapping the reference set invalidates cached results
+        processor.load_reference_images([np.zeros((256, 256))])
+        third = json.loads(upload().data)
+        assert third['min_mse'] != first['min_mse']
+        
+        info = json.loads(self.app.get('/info').data)
+        assert info['result_cache']['hits'] >= 1
+
+    def test_visualization_rendered_once(self, tmp_path):
+        pixels = np.random.randint(0, 256, (256, 256), dtype=np.uint8)
+        (tmp_path / 'test_sample.png').write_bytes(_png_bytes(pixels))
+        render_cache = app_module.RenderCache(str(tmp_path / 'viz'))
+        processor = app_module.processor
+        
+        with patch.object(app_module, 'TEST_SAMPLES_DIR', str(tmp_path)), \
+             patch.object(app_module, 'VISUALIZATION_CACHE_DIR', str(tmp_path / 'viz')), \
+             patch.object(app_module, 'render_cache', render_cache), \
+             patch.object(processor, 'visualize_wavelet_decomposition',
+                          wraps=processor.visualize_wavelet_decomposition) as mock_visualize:
+            first = self.app.get('/visualize/test_sample.png')
+            second = self.app.get('/visualize/test_sample.png')
+            assert mock_visualize.call_count == 1
+        
+        assert first.status_code == second.status_code == 200
+        assert first.data == second.data
+        assert first.data.startswith(b'\x89PNG')
+
+    def test_bulk_classification_job(self, reference_pixels, tmp_path):
+        pixels = reference_pixels
+        (tmp_path / 'study').mkdir()
+        for name in ('a.png', 'b.png'):
+            (tmp_path / 'study' / name).write_bytes(_png_bytes(pixels))
+        with patch.object(app_module, 'DATA_DIR', str(tmp_path)):
+            response = self.app.post('/jobs/classify', json={'directory': 'study'})
+            assert response.status_code == 202
+            job_id = json.loads(response.data)['job_id']
+            app_module.job_manager.wait(job_id, timeout=10)
+            
+            status = json.loads(self.app.get(f'/jobs/{job_id}').data)
+            result = self.app.get(f'/jobs/{job_id}/result')
+        
+        assert status['status'] == 'finished'
+        assert status['progress'] == {'done': 2, 'total': 2}
+        data = json.loads(result.data)
+        assert [r['filename'] for r in data['results']] == ['a.png', 'b.png']
+        assert all(r['classification'] == 'Normal' for r in data['results'])
+
+    def test_bulk_classification_rejects_outside_directory(self, tmp_path):
+        with patch.object(app_module, 'DATA_DIR', str(tmp_path)):
+            response = self.app.post('/jobs/classify', json={'directory': '../'})
+        assert response.status_code == 400
+
+    def test_unknown_job(self):
+        assert self.app.get('/jobs/missing').status_code == 404
+        assert self.app.get('/jobs/missing/result').status_code == 404
+
+    def test_batch_upload_streams_ndjson(self, reference_pixels):
+        import zipfile
+        pixels = reference_pixels
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('study/c.png', _png_bytes(pixels))
+            zf.writestr('study/notes.txt', b'not an image')
+        archive.seek(0)
+        processor = app_module.processor
+        with patch.object(processor, 'classify_batch', wraps=processor.classify_batch) as mock_batch:
+            response = self.app.post('/upload_batch', data={
+                'files': [(io.BytesIO(_png_bytes(pixels)), 'a.png'),
+                          (io.BytesIO(_png_bytes(255 - pixels)), 'b.png'),
+                          (archive, 'study.zip')]
+            }, content_type='multipart/form-data')
+            lines = [json.loads(line) for line in response.data.decode().splitlines()]
+            assert mock_batch.call_count == 1
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        results, summary = lines[:-1], lines[-1]['summary']
+        assert sorted(r['filename'] for r in results) == ['a.png', 'b.png', 'study/c.png', 'study/notes.txt']
+        by_name = {r['filename']: r for r in results}
+        assert by_name['a.png']['classification'] == 'Normal'
+        assert by_name['study/c.png']['classification'] == 'Normal'
+        assert 'error' in by_name['study/notes.txt']
+        assert summary == {'classified': 3, 'abnormal': 1, 'errors': 1}
+
+    def test_upload_reports_timings_when_profiling(self, reference_pixels):
+        pixels = reference_pixels
+        with patch.dict(app.config, {'PROFILE_REQUESTS': True}):
+            response = self.app.post('/upload', data={
+                'file': (io.BytesIO(_png_bytes(255 - pixels)), 'profiled.png')
+            }, content_type='multipart/form-data')
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert {'read_upload', 'decode', 'dwt', 'mse_search'} <= set(data['timings']['stages'])
+        assert 'json_encode;dur=' in response.headers['Server-Timing']
+
+    def test_batch_upload_continues_after_corrupt_archive(self, reference_pixels):
+        import tarfile
+        pixels = reference_pixels
+        image_bytes = _png_bytes(pixels)
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tf:
+            member = tarfile.TarInfo('study/a.png')
+            member.size = len(image_bytes)
+            tf.addfile(member, io.BytesIO(image_bytes))
+        archive.seek(0)
+        response = self.app.post('/upload_batch', data={
+            'files': [(archive, 'study.tgz'),
+                      (io.BytesIO(b'PK not really a zip'), 'bad.zip'),
+                      (io.BytesIO(image_bytes), 'c.png')]
+        }, content_type='multipart/form-data')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        
+        by_name = {r['filename']: r for r in lines[:-1]}
+        assert by_name['study/a.png']['classification'] == 'Normal'
+        assert by_name['bad.zip']['error'].startswith('Invalid archive: ')
+        assert by_name['c.png']['classification'] == 'Normal'
+        assert lines[-1]['summary'] == {'classified': 2, 'abnormal': 0, 'errors': 1}
+
+    def test_batch_upload_spools_to_disk(self):
+        streams = []
+        original = app_module.Request._get_file_stream
+        
+        def record(request, *args, **kwargs):
+            stream = original(request, *args, **kwargs)
+            streams.append(stream)
+            return stream
+        
+        payload = b'x' * (1024 * 1024)
+        with patch.object(app_module.Request, '_get_file_stream', record), \
+             patch.object(app_module.processor, 'ensure_reference_database', side_effect=OSError('no references')):
+            self.app.post('/upload_batch', data={'files': [(io.BytesIO(payload), 'a.png')]},
+                          content_type='multipart/form-data')
+        assert len(streams) == 1 and not isinstance(streams[0], io.BytesIO)
+
+    def test_batch_upload_reports_reference_load_errors(self):
+        with patch.object(app_module.processor, 'ensure_reference_database',
+                          side_effect=FileNotFoundError('data/reference_signals')):
+            response = self.app.post('/upload_batch', data={
+                'files': [(io.BytesIO(b'image'), 'a.png')]
+            }, content_type='multipart/form-data')
+        assert response.status_code == 500
+        assert json.loads(response.data)['error'].startswith('Processing error: ')
+
+    def test_too_large_names_endpoint_limit(self):
+        payload = b'x' * (3 * 1024 * 1024)
+        with patch.dict(app.config, {'MAX_CONTENT_LENGTH': 1024 * 1024, 'MAX_BATCH_CONTENT_LENGTH': 2 * 1024 * 1024}):
+            single = self.app.post('/upload', data={'file': (io.BytesIO(payload), 'a.png')},
+                                   content_type='multipart/form-data')
+            batch = self.app.post('/upload_batch', data={'files': [(io.BytesIO(payload), 'a.png')]},
+                                  content_type='multipart/form-data')
+        assert single.status_code == batch.status_code == 413
+        assert json.loads(single.data)['error'] == 'File too large. Maximum size is 1MB.'
+        assert json.loads(batch.data)['error'] == 'File too large. Maximum size is 2MB.'
+
+    def test_timings_logged_without_main(self, reference_pixels):
+        import logging
+        logger = logging.getLogger('brainmapping')
+        # Importing app configures the logger, as under gunicorn
+        assert logger.handlers and logger.isEnabledFor(logging.INFO)
+        
+        class Collect(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.records = []
+            
+            def emit(self, record):
+                self.records.append(record)
+        
+        pixels = reference_pixels
+        handler = Collect()
+        logger.addHandler(handler)
+        try:
+            with patch.dict(app.config, {'PROFILE_REQUESTS': True}):
+                self.app.post('/upload', data={'file': (io.BytesIO(_png_bytes(pixels)), 'logged.png')},
+                              content_type='multipart/form-data')
+        finally:
+            logger.removeHandler(handler)
+        
+        messages = [record.getMessage() for record in handler.records if record.levelno == logging.INFO]
+        assert any(message.startswith('timings upload:') and 'path=/upload' in message for message in messages)
+
+    def test_batch_upload_requires_files(self):
+        response = self.app.post('/upload_batch', data={}, content_type='multipart/form-data')
+        assert response.status_code == 400
 
 if __name__ == '__main__':
     pytest.main([__file__])
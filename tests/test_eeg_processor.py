@@ -42,6 +42,59 @@ class TestEEGProcessor:
         assert result.shape[0] > 0
         assert result.shape[1] > 0
     
+    def test_apply_2d_dwt_matches_nested_blocks(self):
+        """Test the layout matches the original three-level np.block nesting"""
+        import pywt
+        cA1, (cH1, cV1, cD1) = pywt.dwt2(self.test_image_data, 'db1')
+        cA2, (cH2, cV2, cD2) = pywt.dwt2(cA1, 'db1')
+        cA3, (cH3, cV3, cD3) = pywt.dwt2(cA2, 'db1')
+        caa = np.block([[cA3, cH3], [cV3, cD3]])
+        ca = np.block([[caa, cH2], [cV2, cD2]])
+        w1 = np.block([[ca, cH1], [cV1, cD1]])
+        
+        np.testing.assert_allclose(self.processor.apply_2d_dwt(self.test_image_data), w1)
+    
+    def test_apply_2d_dwt_honours_levels(self):
+        """Test the number of decomposition levels is configurable"""
+        processor = EEGProcessor(levels=5)
+        result = processor.apply_2d_dwt(self.test_image_data)
+        assert result.shape == (256, 256)
+        # The coarsest approximation band is 8x8 after five db1 levels
+        np.testing.assert_allclose(result[:8, :8].mean(), self.test_image_data.mean() * 32, rtol=1e-9)
+        
+        padded = EEGProcessor(wavelet='db4', levels=4).apply_2d_dwt(self.test_image_data)
+        assert padded is not None
+        assert padded.shape[0] >= 256
+    
+    def test_apply_2d_dwt_reuses_buffer(self):
+        """Test the transform is written into a caller-supplied buffer"""
+        buffer = np.empty((256, 256))
+        result = self.processor.apply_2d_dwt(self.test_image_data, out=buffer)
+        assert result is buffer
+        np.testing.assert_array_equal(result, self.processor.apply_2d_dwt(self.test_image_data))
+        assert self.processor.apply_2d_dwt(self.test_image_data, out=np.empty((10, 10))) is None
+    
+    def test_decompose_reused_by_transform(self):
+        """Test a precomputed decomposition gives the same layout"""
+        decomposition = self.processor.decompose(self.test_image_data)
+        assert len(decomposition) == 3
+        assert decomposition[2][0].shape == (32, 32)
+        with patch('pywt.dwt2') as mock_dwt2:
+            reused = self.processor.apply_2d_dwt(self.test_image_data, decomposition=decomposition)
+            mock_dwt2.assert_not_called()
+        np.testing.assert_array_equal(reused, self.processor.apply_2d_dwt(self.test_image_data))
+    
+    def test_float32_mode(self):
+        """Test single precision is kept through DWT and references"""
+        processor = EEGProcessor(dtype=np.float32)
+        transform = processor.apply_2d_dwt(self.test_image_data)
+        assert transform.dtype == np.float32
+        processor.reference_transforms = [transform]
+        assert processor.reference_transforms.matrix.dtype == np.float32
+        
+        with pytest.raises(ValueError):
+            EEGProcessor(dtype=np.int32)
+    
     def test_calculate_mse(self):
         """Test MSE calculation"""
         img1 = np.ones((100, 100))
@@ -77,6 +130,34 @@ class TestEEGProcessor:
         result = self.processor.apply_2d_dwt(None)
         assert result is None
     
+    def test_load_image_sources(self, tmp_path):
+        """Test images load identically from paths, bytes and file objects"""
+        from PIL import Image
+        import io
+        pixels = np.random.randint(0, 256, (256, 256), dtype=np.uint8)
+        path = tmp_path / 'sample.png'
+        Image.fromarray(pixels).save(path)
+        
+        from_path = self.processor.load_image(str(path))
+        np.testing.assert_array_equal(from_path, pixels)
+        np.testing.assert_array_equal(self.processor.load_image(path.read_bytes()), from_path)
+        with open(path, 'rb') as f:
+            np.testing.assert_array_equal(self.processor.load_image(f), from_path)
+        
+        buffer = np.empty((256, 256))
+        assert self.processor.load_image(io.BytesIO(path.read_bytes()), out=buffer) is buffer
+        np.testing.assert_array_equal(buffer, from_path)
+    
+    def test_load_image_normalizes_other_inputs(self, tmp_path):
+        """Test colour and differently sized images are converted and resized"""
+        from PIL import Image
+        path = tmp_path / 'large.jpg'
+        Image.fromarray(np.random.randint(0, 256, (1024, 768, 3), dtype=np.uint8)).save(path)
+        
+        full = self.processor.load_image(str(path))
+        draft = EEGProcessor(jpeg_draft=True).load_image(str(path))
+        assert full.shape == draft.shape == (256, 256)
+    
     def test_load_image_nonexistent(self):
         """Test loading non-existent image"""
         result = self.processor.load_image('nonexistent_file.png')
@@ -108,6 +189,152 @@ class TestEEGProcessorIntegration:
                 assert 'confidence' in result
                 assert 'min_mse' in result
                 assert result['classification'] in ['Normal', 'Abnormal']
+    
+    def test_classify_batch_matches_single(self):
+        """Test batched classification agrees with one-at-a-time classification"""
+        rng = np.random.default_rng(0)
+        references = [rng.random((256, 256)) * 255 for _ in range(4)]
+        self.processor.load_reference_images(references)
+        images = [references[1] + rng.normal(0, 5, (256, 256)), rng.random((256, 256)) * 255]
+        
+        batch_results = self.processor.classify_batch(images, batch_size=1)
+        
+        for image, batch_result in zip(images, batch_results):
+            with patch.object(self.processor, 'load_image', return_value=image):
+                single_result = self.processor.classify_eeg_pattern('test_image.png')
+            assert batch_result['classification'] == single_result['classification']
+            assert batch_result['matched_frame'] == single_result['matched_frame']
+            np.testing.assert_allclose(batch_result['all_mse_values'],
+                                       single_result['all_mse_values'], rtol=1e-9)
+        assert batch_results[0]['matched_frame'] == 2
+    
+    def test_float32_decisions_match_float64(self):
+        """Test single precision gives the same decisions as double precision"""
+        rng = np.random.default_rng(3)
+        references = [rng.random((256, 256)) * 255 for _ in range(5)]
+        images = [references[i] + rng.normal(0, 20, (256, 256)) for i in range(5)]
+        images += [rng.random((256, 256)) * 255 for _ in range(5)]
+        
+        single = EEGProcessor(dtype=np.float32)
+        single.load_reference_images(references)
+        self.processor.load_reference_images(references)
+        
+        for double_result, single_result in zip(self.processor.classify_batch(images),
+                                                single.classify_batch(images)):
+            assert single_result['classification'] == double_result['classification']
+            assert single_result['matched_frame'] == double_result['matched_frame']
+            assert single_result['min_mse'] == pytest.approx(double_result['min_mse'], rel=1e-3)
+    
+    def test_classify_batch_reports_load_errors(self):
+        """Test that unreadable inputs get an error entry in place"""
+        self.processor.reference_transforms = [np.random.rand(256, 256)]
+        results = self.processor.classify_batch(['nonexistent_file.png', np.random.rand(256, 256)])
+        assert results[0] == {"error": "Failed to load test image"}
+        assert 'classification' in results[1]
+    
+    def test_profile_adds_stage_timings(self):
+        """Test profiling adds per-stage timings only when enabled"""
+        image = np.random.rand(256, 256)
+        self.processor.load_reference_images([image])
+        with patch.object(self.processor, 'load_image', return_value=image):
+            assert 'timings' not in self.processor.classify_eeg_pattern('test_image.png')
+        
+        processor = EEGProcessor(profile=True)
+        processor.reference_transforms = self.processor.reference_transforms
+        with patch.object(processor, 'load_image', return_value=image):
+            result = processor.classify_eeg_pattern('test_image.png')
+        assert set(result['timings']['stages']) == {'decode', 'dwt', 'mse_search', 'build_result'}
+        assert result['timings']['total_ms'] > 0
+    
+    def test_classify_without_references_reports_error(self):
+        """Test an empty reference set gives an error instead of crashing"""
+        result = self.processor.classify_image(np.random.rand(256, 256))
+        assert result == {"error": "No reference patterns loaded"}
+    
+    def test_reference_set_swap_during_classification(self):
+        """Test readers see either the old or the new reference set, never a partial one"""
+        import threading
+        rng = np.random.default_rng(5)
+        old = [self.processor.apply_2d_dwt(rng.random((256, 256)) * 255) for _ in range(3)]
+        new = [self.processor.apply_2d_dwt(rng.random((256, 256)) * 255) for _ in range(6)]
+        self.processor.reference_transforms = old
+        
+        stop = threading.Event()
+        failures = []
+        
+        def classify():
+            image = rng.random((256, 256))
+            while not stop.is_set():
+                result = self.processor.classify_image(image)
+                if 'error' in result or len(result['all_mse_values']) not in (3, 6):
+                    failures.append(result)
+        
+        readers = [threading.Thread(target=classify) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(20):
+            self.processor.reference_transforms = new if i % 2 == 0 else old
+        stop.set()
+        for reader in readers:
+            reader.join()
+        
+        assert failures == []
+    
+    def test_published_reference_set_is_read_only(self):
+        """Test a published reference set cannot be modified in place"""
+        self.processor.reference_transforms = [np.random.rand(128, 128)]
+        with pytest.raises(ValueError):
+            self.processor.reference_transforms.matrix[0, 0] = 1.0
+    
+    @patch.object(EEGProcessor, '_build_reference_set')
+    def test_ensure_reference_database_loads_once(self, mock_build):
+        """Test concurrent callers trigger a single reference load"""
+        import threading
+        from reference_set import ReferenceSet
+        mock_build.return_value = ReferenceSet([np.random.rand(128, 128)], files=['ref_1.png'])
+        
+        threads = [threading.Thread(target=self.processor.ensure_reference_database, args=('fake_dir',))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert mock_build.call_count == 1
+        assert self.processor.reference_files == ['ref_1.png']
+
+    
+    def test_classify_signal_matches_image_path(self, tmp_path):
+        """Test raw signals are classified exactly like their raw spectrogram PNGs"""
+        from signal_generator import EEGSignalGenerator
+        generator = EEGSignalGenerator(duration=4, seed=11)
+        self.processor.load_reference_images(generator.batch_to_spectrograms(generator.generate_batch(3, 'normal')))
+        signals = np.vstack([generator.generate_batch(1, 'normal'), generator.generate_batch(1, 'high_delta')])
+        
+        batch = self.processor.classify_signal(signals, fs=generator.fs)
+        for i, eeg_signal in enumerate(signals):
+            path = str(tmp_path / f'sample_{i}.png')
+            generator.signal_to_spectrogram(eeg_signal, path, raw=True)
+            from_image = self.processor.classify_eeg_pattern(path, threshold=self.processor.raw_threshold)
+            from_signal = self.processor.classify_signal(eeg_signal, fs=generator.fs)
+            assert from_signal['min_mse'] == pytest.approx(from_image['min_mse'])
+            assert from_signal['classification'] == from_image['classification'] == batch[i]['classification']
+    
+    def test_classify_signal_tells_normal_from_abnormal(self):
+        """Test raw signals are separated at the raw-mode threshold, not only consistent"""
+        from signal_generator import ABNORMALITY_TYPES, EEGSignalGenerator
+        generator = EEGSignalGenerator(seed=5)
+        self.processor.load_reference_images(generator.batch_to_spectrograms(generator.generate_batch(5, 'normal')))
+        
+        normal = self.processor.classify_signal(generator.generate_batch(20, 'normal'), fs=generator.fs)
+        normal_correct = np.mean([r['classification'] == 'Normal' for r in normal])
+        abnormal_correct = []
+        for kind in ABNORMALITY_TYPES:
+            abnormal = self.processor.classify_signal(generator.generate_batch(20, kind), fs=generator.fs)
+            abnormal_correct.append(np.mean([r['classification'] == 'Abnormal' for r in abnormal]))
+        
+        assert normal_correct >= 0.7 and min(abnormal_correct) >= 0.7
+        assert (normal_correct + np.mean(abnormal_correct)) / 2 >= 0.8
 
 
 if __name__ == '__main__':
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Unit tests for the background job manager"""
+
+import threading
+
+import pytest
+
+from jobs import JobManager
+
+
+class TestJobManager:
+    def setup_method(self):
+        self.manager = JobManager(max_workers=2)
+
+    def teardown_method(self):
+        self.manager.shutdown()
+
+    def test_job_result(self):
+        job = self.manager.submit('add', lambda job, a, b: a + b, 2, 3)
+        finished = self.manager.wait(job.id, timeout=5)
+        assert finished.status == 'finished'
+        assert finished.result == 5
+        assert finished.describe()['job_id'] == job.id
+
+    def test_job_failure_is_recorded(self):
+        def fail(job):
+            raise RuntimeError('boom')
+
+        job = self.manager.wait(self.manager.submit('fail', fail).id, timeout=5)
+        assert job.status == 'failed'
+        assert job.error == 'boom'
+
+    def test_submit_does_not_block(self):
+        release = threading.Event()
+        job = self.manager.submit('wait', lambda job: release.wait(5))
+        assert self.manager.get(job.id).status in ('queued', 'running')
+        release.set()
+        assert self.manager.wait(job.id, timeout=5).status == 'finished'
+
+    def test_progress_reported(self):
+        def work(job):
+            for i in range(3):
+                job.report_progress(i + 1, 3)
+
+        job = self.manager.wait(self.manager.submit('work', work).id, timeout=5)
+        assert job.progress == {'done': 3, 'total': 3}
+
+    def test_oldest_finished_jobs_forgotten(self):
+        manager = JobManager(max_workers=1, max_jobs=2)
+        try:
+            ids = [manager.submit('noop', lambda job: None).id for _ in range(3)]
+            manager.wait(ids[-1], timeout=5)
+            manager.submit('noop', lambda job: None)
+            assert manager.get(ids[0]) is None
+        finally:
+            manager.shutdown()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Unit tests for multi-channel montage classification"""
+
+import numpy as np
+import pytest
+
+from eeg_processor import EEGProcessor
+from montage import MontageClassifier, build_channel_references
+from signal_generator import EEGSignalGenerator
+
+
+class TestMontageClassifier:
+    def setup_method(self):
+        self.generator = EEGSignalGenerator(duration=4, seed=31)
+        self.processor = EEGProcessor()
+        self.processor.load_reference_images(self.generator.batch_to_spectrograms(self.generator.generate_batch(3, 'normal')))
+        self.data = np.vstack([self.generator.generate_batch(5, 'normal'), self.generator.generate_batch(3, 'high_delta')])
+
+    def test_channels_match_single_channel_path(self):
+        montage = MontageClassifier(self.processor, max_workers=3)
+        try:
+            result = montage.classify(self.data)
+        finally:
+            montage.close()
+
+        assert result['channel_count'] == 8
+        assert [r['channel'] for r in result['channels']] == list(range(8))
+        for channel, channel_result in zip(self.data, result['channels']):
+            expected = self.processor.classify_signal(channel, fs=256)
+            assert channel_result['min_mse'] == pytest.approx(expected['min_mse'])
+            assert channel_result['classification'] == expected['classification']
+        expected_abnormal = [r['channel'] for r in result['channels'] if r['classification'] == 'Abnormal']
+        assert result['abnormal_channels'] == expected_abnormal
+        assert result['classification'] == ('Abnormal' if expected_abnormal else 'Normal')
+
+    def test_per_channel_references(self):
+        recordings = [self.generator.generate_batch(2, 'normal') for _ in range(3)]
+        channel_references = build_channel_references(self.processor, recordings, fs=256)
+        assert len(channel_references) == 2 and len(channel_references[0]) == 3
+
+        montage = MontageClassifier(self.processor, channel_references, channel_names=['Fp1', 'Fp2'])
+        try:
+            result = montage.classify(recordings[0])
+        finally:
+            montage.close()
+        assert [r['channel_name'] for r in result['channels']] == ['Fp1', 'Fp2']
+        assert all(r['min_mse'] == pytest.approx(0, abs=1e-6) for r in result['channels'])
+
+    def test_channel_count_mismatch(self):
+        montage = MontageClassifier(self.processor, channel_names=['Fp1'])
+        try:
+            with pytest.raises(ValueError):
+                montage.classify(self.data)
+        finally:
+            montage.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
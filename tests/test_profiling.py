@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Unit tests for per-stage profiling"""
+
+import logging
+
+import numpy as np
+
+from profiling import NULL_PROFILER, StageProfiler, register_callback, unregister_callback
+
+
+class TestStageProfiler:
+    def test_stages_accumulate(self):
+        profiler = StageProfiler('test')
+        for _ in range(3):
+            with profiler.stage('dwt'):
+                pass
+        with profiler.stage('mse_search'):
+            pass
+
+        report = profiler.report()
+        assert report['stages']['dwt']['calls'] == 3
+        assert report['stages']['mse_search']['calls'] == 1
+        assert report['total_ms'] >= sum(entry['ms'] for entry in report['stages'].values())
+
+    def test_stage_recorded_when_block_raises(self):
+        profiler = StageProfiler('test')
+        try:
+            with profiler.stage('decode'):
+                raise ValueError('bad image')
+        except ValueError:
+            pass
+        assert profiler.report()['stages']['decode']['calls'] == 1
+
+    def test_allocation_tracking(self):
+        profiler = StageProfiler('test', track_allocations=True)
+        with profiler.stage('allocate'):
+            data = np.ones(1024 * 1024)
+        entry = profiler.report()['stages']['allocate']
+        assert entry['allocated_kb'] >= 8 * 1024 * 0.9
+        assert entry['peak_kb'] >= entry['allocated_kb']
+        del data
+
+    def test_finish_logs_and_calls_callbacks(self, caplog):
+        calls = []
+
+        def callback(name, report, context):
+            calls.append((name, report, context))
+
+        register_callback(callback)
+        try:
+            profiler = StageProfiler('upload')
+            with profiler.stage('decode'):
+                pass
+            with caplog.at_level(logging.INFO, logger='brainmapping'):
+                report = profiler.finish(path='/upload')
+        finally:
+            unregister_callback(callback)
+
+        assert calls == [('upload', report, {'path': '/upload'})]
+        assert 'timings upload' in caplog.text
+        assert 'decode=' in caplog.text
+
+        StageProfiler('upload').finish()
+        assert len(calls) == 1
+
+    def test_failing_callback_is_logged(self, caplog):
+        def callback(name, report, context):
+            raise RuntimeError('exporter down')
+
+        register_callback(callback)
+        try:
+            with caplog.at_level(logging.WARNING, logger='brainmapping'):
+                report = StageProfiler('upload').finish()
+        finally:
+            unregister_callback(callback)
+        assert report['stages'] == {}
+        assert 'exporter down' in caplog.text
+
+    def test_null_profiler(self):
+        with NULL_PROFILER.stage('dwt'):
+            pass
+        assert NULL_PROFILER.report() is None
+        assert NULL_PROFILER.finish() is None
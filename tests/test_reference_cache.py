@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""Unit tests for Reference Cache module"""
+
+import pytest
+import numpy as np
+from unittest.mock import patch
+from PIL import Image
+from reference_cache import SharedReferenceStore, TransformCache, file_digest
+from reference_set import ReferenceSet
+from eeg_processor import EEGProcessor
+
+class TestTransformCache:
+    def test_round_trip(self, tmp_path):
+        cache_path = str(tmp_path / 'cache.npz')
+        cache = TransformCache(cache_path)
+        key = TransformCache.key('abc', 'db1', 3)
+        cache.put(key, np.arange(16.0).reshape(4, 4))
+        cache.save()
+        
+        reloaded = TransformCache(cache_path)
+        np.testing.assert_array_equal(reloaded.get(key), np.arange(16.0).reshape(4, 4))
+        assert reloaded.get(TransformCache.key('abc', 'db2', 3)) is None
+    
+    def test_save_drops_unused_entries(self, tmp_path):
+        cache_path = str(tmp_path / 'cache.npz')
+        cache = TransformCache(cache_path)
+        cache.put('old', np.zeros(2))
+        cache.save()
+        
+        cache = TransformCache(cache_path)
+        cache.put('new', np.ones(2))
+        cache.save()
+        assert TransformCache(cache_path).stored == {'new'}
+    
+    def test_file_digest_tracks_content(self, tmp_path):
+        path = tmp_path / 'a.bin'
+        path.write_bytes(b'one')
+        first = file_digest(str(path))
+        path.write_bytes(b'two')
+        assert file_digest(str(path)) != first
+
+class TestSharedReferenceStore:
+    def test_open_is_read_only_memmap(self, tmp_path):
+        references = ReferenceSet([np.random.rand(8, 8) for _ in range(3)])
+        store = SharedReferenceStore(str(tmp_path))
+        store.write('f' * 64, references, ['a.png', 'b.png', 'c.png'])
+        
+        shared, files = store.open('f' * 64)
+        assert isinstance(shared.matrix, np.memmap)
+        assert not shared.matrix.flags['WRITEABLE']
+        assert files == ['a.png', 'b.png', 'c.png']
+        np.testing.assert_array_equal(shared.matrix, references.matrix)
+        np.testing.assert_allclose(shared.norms, references.norms)
+    
+    def test_fingerprint_mismatch(self, tmp_path):
+        store = SharedReferenceStore(str(tmp_path))
+        assert store.open('0' * 64) is None
+        store.write('f' * 64, ReferenceSet([np.zeros((4, 4))]), ['a.png'])
+        assert store.open('0' * 64) is None
+
+def _write_references(reference_dir, count):
+    reference_dir.mkdir()
+    for i in range(count):
+        pixels = np.random.randint(0, 256, (256, 256), dtype=np.uint8)
+        Image.fromarray(pixels).save(reference_dir / f'eeg{i+1}n.png')
+
+class TestProcessorCache:
+    def test_warm_start_skips_transform(self, tmp_path):
+        reference_dir = tmp_path / 'refs'
+        _write_references(reference_dir, 3)
+        
+        processor = EEGProcessor(cache_dir=str(tmp_path / 'cache'))
+        processor.load_reference_database(str(reference_dir))
+        cold_matrix = processor.reference_transforms.matrix.copy()
+        
+        warm = EEGProcessor(cache_dir=str(tmp_path / 'cache'))
+        with patch.object(warm, 'apply_2d_dwt') as mock_dwt:
+            warm.load_reference_database(str(reference_dir))
+            mock_dwt.assert_not_called()
+        np.testing.assert_array_equal(warm.reference_transforms.matrix, cold_matrix)
+        assert isinstance(warm.reference_transforms.matrix, np.memmap)
+        assert len(warm.reference_patterns) == 3
+    
+    def test_changed_file_only_retransformed(self, tmp_path):
+        reference_dir = tmp_path / 'refs'
+        _write_references(reference_dir, 3)
+        EEGProcessor(cache_dir=str(tmp_path / 'cache')).load_reference_database(str(reference_dir))
+        
+        pixels = np.zeros((256, 256), dtype=np.uint8)
+        Image.fromarray(pixels).save(reference_dir / 'eeg2n.png')
+        
+        processor = EEGProcessor(cache_dir=str(tmp_path / 'cache'))
+        with patch.object(processor, 'apply_2d_dwt', wraps=processor.apply_2d_dwt) as mock_dwt:
+            processor.load_reference_database(str(reference_dir))
+            assert mock_dwt.call_count == 1
+        assert processor.reference_transforms.mse(np.zeros((256, 256)))[1] == pytest.approx(0, abs=1e-6)
+    
+    def test_cold_build_writes_rows_into_store(self, tmp_path):
+        import os
+        import tracemalloc
+        reference_dir = tmp_path / 'refs'
+        _write_references(reference_dir, 24)
+        (reference_dir / 'broken.png').write_bytes(b'not an image')
+        
+        processor = EEGProcessor(cache_dir=str(tmp_path / 'cache'))
+        tracemalloc.start()
+        try:
+            processor.load_reference_database(str(reference_dir))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        
+        references = processor.reference_transforms
+        assert len(references) == 24 and isinstance(references.matrix, np.memmap)
+        # Rows go straight to the memory-mapped store; the old list-then-stack build peaked near two matrices
+        assert peak < references.matrix.nbytes
+        # The unreadable file was compacted away and no temporary matrix is left behind
+        assert not [name for name in os.listdir(tmp_path / 'cache') if name.endswith('.tmp')]
+        
+        warm = EEGProcessor(cache_dir=str(tmp_path / 'cache'))
+        warm.load_reference_database(str(reference_dir))
+        np.testing.assert_array_equal(warm.reference_transforms.matrix, references.matrix)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
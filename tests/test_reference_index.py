@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""Unit tests for Reference Index module"""
+
+import pytest
+import numpy as np
+from reference_index import ReferenceIndex, cascade_search
+from reference_set import ReferenceSet
+from eeg_processor import EEGProcessor
+
+class TestReferenceIndex:
+    def setup_method(self):
+        self.processor = EEGProcessor()
+        rng = np.random.default_rng(0)
+        self.images = [rng.random((64, 64)) * 255 for _ in range(40)]
+        self.references = ReferenceSet([self.processor.apply_2d_dwt(img) for img in self.images])
+        self.tests = np.stack([self.processor.apply_2d_dwt(img + rng.normal(0, 2, img.shape))
+                               for img in self.images[:10]])
+    
+    def test_approximation_key_finds_nearest(self):
+        index = ReferenceIndex(self.references, band_shape=(8, 8), shortlist=4)
+        candidates, mse = index.search(self.tests)
+        assert candidates.shape == (10, 4)
+        best = candidates[np.arange(10), np.argmin(mse, axis=1)]
+        np.testing.assert_array_equal(best, np.arange(10))
+        assert index.recall(self.tests) == 1.0
+    
+    def test_shortlist_mse_is_exact(self):
+        index = ReferenceIndex(self.references, band_shape=(8, 8), shortlist=5)
+        candidates, mse = index.search(self.tests[:1])
+        exact = self.references.mse(self.tests[:1])[0]
+        np.testing.assert_allclose(mse[0], exact[candidates[0]], rtol=1e-9)
+    
+    def test_pca_key(self):
+        index = ReferenceIndex(self.references, key='pca', components=16, shortlist=4)
+        assert index.keys.shape == (40, 16)
+        assert index.recall(self.tests) == 1.0
+    
+    def test_invalid_key(self):
+        with pytest.raises(ValueError):
+            ReferenceIndex(self.references, key='lsh')
+    
+    def test_empty_reference_set(self):
+        tests = np.stack([self.processor.apply_2d_dwt(self.images[0])])
+        for key in ('approximation', 'pca'):
+            index = ReferenceIndex(ReferenceSet([]), key=key)
+            candidates, mse = index.search(tests)
+            assert candidates.shape == mse.shape == (1, 0)
+            assert index.recall(tests) is None
+        
+        report = EEGProcessor(search='approximate').evaluate_index([self.images[0]])
+        assert report['error'] == "No reference patterns loaded"
+        assert report['recall'] is None
+
+class TestCascadeSearch:
+    def setup_method(self):
+        self.processor = EEGProcessor()
+        rng = np.random.default_rng(2)
+        self.images = [rng.random((256, 256)) * 255 for _ in range(12)]
+        self.references = ReferenceSet([self.processor.apply_2d_dwt(img) for img in self.images])
+        self.rng = rng
+    
+    def test_cascade_finds_exact_minimum(self):
+        test = self.processor.apply_2d_dwt(self.images[4] + self.rng.normal(0, 3, (256, 256)))
+        mse_values, compared = cascade_search(self.references, test, levels=3)
+        exact = self.references.mse(test)
+        
+        assert mse_values[4] == pytest.approx(exact[4])
+        assert min(v for v in mse_values if v is not None) == pytest.approx(exact.min())
+        assert compared < 0.5
+    
+    def test_cascade_stops_early_when_abnormal(self):
+        test = self.processor.apply_2d_dwt(np.zeros((256, 256)))
+        mse_values, compared = cascade_search(self.references, test, levels=3, threshold=600)
+        assert min(v for v in mse_values if v is not None) >= 600
+        assert compared < 0.2
+    
+    def test_processor_cascade_matches_exact(self):
+        exact = EEGProcessor()
+        cascade = EEGProcessor(search='cascade')
+        exact.reference_transforms = self.references
+        cascade.reference_transforms = self.references
+        
+        tests = [self.images[9] + self.rng.normal(0, 3, (256, 256))]
+        exact_result = exact.classify_batch(tests)[0]
+        cascade_result = cascade.classify_batch(tests)[0]
+        assert cascade_result['classification'] == exact_result['classification'] == 'Normal'
+        assert cascade_result['matched_frame'] == exact_result['matched_frame'] == 10
+        assert cascade_result['min_mse'] == pytest.approx(exact_result['min_mse'])
+
+class TestApproximateSearch:
+    def test_processor_approximate_matches_exact(self):
+        rng = np.random.default_rng(1)
+        images = [rng.random((256, 256)) * 255 for _ in range(20)]
+        exact = EEGProcessor()
+        approximate = EEGProcessor(search='approximate', index_options={'shortlist': 3})
+        transforms = [exact.apply_2d_dwt(img) for img in images]
+        exact.reference_transforms = transforms
+        approximate.reference_transforms = transforms
+        
+        tests = [images[7] + rng.normal(0, 3, (256, 256))]
+        exact_result = exact.classify_batch(tests)[0]
+        approximate_result = approximate.classify_batch(tests)[0]
+        
+        assert approximate_result['min_mse'] == pytest.approx(exact_result['min_mse'])
+        assert approximate_result['matched_frame'] == exact_result['matched_frame'] == 8
+        assert sum(v is not None for v in approximate_result['all_mse_values']) == 3
+        assert approximate.evaluate_index(tests)['recall'] == 1.0
+    
+    def test_invalid_search_mode(self):
+        with pytest.raises(ValueError):
+            EEGProcessor(search='fuzzy')
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Unit tests for Reference Set module"""
+
+import pytest
+import numpy as np
+from reference_set import ReferenceSet
+
+class TestReferenceSet:
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        self.transforms = [rng.random((32, 32)) * 255 for _ in range(5)]
+        self.references = ReferenceSet(self.transforms)
+    
+    def test_matrix_layout(self):
+        assert len(self.references) == 5
+        assert self.references.shape == (32, 32)
+        assert self.references.matrix.shape == (5, 32 * 32)
+        assert self.references.matrix.flags['C_CONTIGUOUS']
+        np.testing.assert_array_equal(self.references[2], self.transforms[2])
+    
+    def test_mse_matches_direct_computation(self):
+        test = np.random.rand(32, 32) * 255
+        expected = [np.mean((test - ref) ** 2) for ref in self.transforms]
+        np.testing.assert_allclose(self.references.mse(test), expected, rtol=1e-9)
+        assert self.references.mse(np.stack([test, test])).shape == (2, 5)
+    
+    def test_exact_match_is_zero(self):
+        assert self.references.mse(self.transforms[3])[3] == pytest.approx(0, abs=1e-6)
+    
+    def test_empty_set(self):
+        references = ReferenceSet([])
+        assert len(references) == 0
+        assert not references
+    
+    def test_mismatched_shapes(self):
+        with pytest.raises(ValueError):
+            ReferenceSet([np.zeros((4, 4)), np.zeros((8, 8))])
+
+if __name__ == '__main__':
+    pytest.main([__file__])
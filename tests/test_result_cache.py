@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Unit tests for Result Cache module"""
+
+import pytest
+from unittest.mock import patch
+import os
+from result_cache import RenderCache, ResultCache
+from eeg_processor import EEGProcessor
+
+class TestResultCache:
+    def setup_method(self):
+        self.cache = ResultCache(max_entries=2, ttl_seconds=60)
+    
+    def test_hit_and_miss_counters(self):
+        assert self.cache.get('a') is None
+        self.cache.put('a', {'classification': 'Normal'})
+        assert self.cache.get('a') == {'classification': 'Normal'}
+        stats = self.cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    
+    def test_returns_copies(self):
+        self.cache.put('a', {'classification': 'Normal'})
+        self.cache.get('a')['uploaded_filename'] = 'x.png'
+        assert 'uploaded_filename' not in self.cache.get('a')
+    
+    def test_least_recently_used_evicted(self):
+        self.cache.put('a', {})
+        self.cache.put('b', {})
+        self.cache.get('a')
+        self.cache.put('c', {})
+        assert self.cache.get('b') is None
+        assert self.cache.get('a') is not None
+        assert self.cache.stats()['evictions'] == 1
+    
+    def test_entries_expire(self):
+        with patch('result_cache.time.monotonic', return_value=100.0):
+            self.cache.put('a', {})
+        with patch('result_cache.time.monotonic', return_value=161.0):
+            assert self.cache.get('a') is None
+    
+    def test_sync_clears_on_new_reference_version(self):
+        self.cache.sync(1)
+        self.cache.put('a', {})
+        self.cache.sync(1)
+        assert self.cache.get('a') is not None
+        self.cache.sync(2)
+        assert self.cache.get('a') is None
+    
+    def test_key_tracks_configuration(self):
+        processor = EEGProcessor()
+        key = ResultCache.key(b'image', processor)
+        assert ResultCache.key(b'image', processor) == key
+        assert ResultCache.key(b'image', processor, threshold=400) != key
+        assert ResultCache.key(b'other', processor) != key
+        processor.reference_transforms = []
+        assert ResultCache.key(b'image', processor) != key
+
+class TestRenderCache:
+    def test_store_and_get(self, tmp_path):
+        cache = RenderCache(str(tmp_path))
+        name = RenderCache.key(b'image', EEGProcessor())
+        assert cache.get(name) is None
+        cache.store(name, lambda path: open(path, 'wb').write(b'png'))
+        assert cache.get(name) == name
+        assert (tmp_path / name).read_bytes() == b'png'
+    
+    def test_size_based_eviction(self, tmp_path):
+        cache = RenderCache(str(tmp_path), max_bytes=250)
+        for i, name in enumerate(['a.png', 'b.png', 'c.png']):
+            cache.store(name, lambda path: open(path, 'wb').write(b'x' * 100))
+            os.utime(tmp_path / name, (i, i))
+        cache.evict()
+        assert sorted(os.listdir(tmp_path)) == ['b.png', 'c.png']
+    
+    def test_key_depends_on_content_and_config(self):
+        processor = EEGProcessor()
+        key = RenderCache.key(b'image', processor)
+        assert RenderCache.key(b'other', processor) != key
+        assert RenderCache.key(b'image', EEGProcessor(levels=4)) != key
+        assert RenderCache.key(b'image', processor, variant='fast') != key
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 """Unit tests for Signal Generator module"""
 
+import os
 import pytest
 import numpy as np
+from PIL import Image
 from signal_generator import EEGSignalGenerator
 
 class TestEEGSignalGenerator:
@@ -23,6 +25,91 @@ class TestEEGSignalGenerator:
         signal = self.generator.generate_normal_eeg()
         assert len(signal) == len(self.generator.t)
         assert isinstance(signal, np.ndarray)
+    
+    def test_seed_is_reproducible(self):
+        first = EEGSignalGenerator(seed=7).generate_normal_eeg()
+        second = EEGSignalGenerator(seed=7).generate_normal_eeg()
+        np.testing.assert_array_equal(first, second)
+    
+    def test_generate_dataset_counts(self, tmp_path):
+        generator = EEGSignalGenerator(duration=2, seed=0)
+        generator.generate_dataset(str(tmp_path), reference_count=2, normal_count=1,
+                                   abnormal_counts={'high_delta': 2, 'high_beta': 1})
+        assert sorted(os.listdir(tmp_path / 'reference_signals')) == ['eeg1n.png', 'eeg2n.png']
+        assert sorted(os.listdir(tmp_path / 'test_samples')) == [
+            'test_abnormal_high_beta.png', 'test_abnormal_high_delta_1.png',
+            'test_abnormal_high_delta_2.png', 'test_normal_1.png']
+    
+    def test_generate_dataset_rejects_unknown_abnormality(self, tmp_path):
+        with pytest.raises(ValueError):
+            self.generator.generate_dataset(str(tmp_path), abnormal_counts={'unknown': 1})
+    
+    def test_parallel_generation_matches_serial(self, tmp_path):
+        generator = EEGSignalGenerator(duration=2)
+        options = dict(reference_count=2, normal_count=1, abnormal_counts={'missing_alpha': 2}, seed=3)
+        generator.generate_dataset(str(tmp_path / 'serial'), **options)
+        generator.generate_dataset(str(tmp_path / 'parallel'), workers=2, **options)
+        
+        for subdir in ('reference_signals', 'test_samples'):
+            names = sorted(os.listdir(tmp_path / 'serial' / subdir))
+            assert names == sorted(os.listdir(tmp_path / 'parallel' / subdir))
+            for name in names:
+                serial = np.asarray(Image.open(tmp_path / 'serial' / subdir / name))
+                parallel = np.asarray(Image.open(tmp_path / 'parallel' / subdir / name))
+                np.testing.assert_array_equal(serial, parallel)
+    
+    def test_generate_batch_shape_and_seed(self):
+        batch = EEGSignalGenerator(seed=1).generate_batch(8, 'high_beta')
+        assert batch.shape == (8, len(self.generator.t))
+        np.testing.assert_array_equal(batch, EEGSignalGenerator(seed=1).generate_batch(8, 'high_beta'))
+    
+    def test_generate_batch_dominant_band(self):
+        generator = EEGSignalGenerator(seed=2)
+        freqs = np.fft.rfftfreq(len(generator.t), 1 / generator.fs)
+        for kind, band in (('high_delta', 'delta'), ('high_beta', 'beta')):
+            spectrum = np.abs(np.fft.rfft(generator.generate_batch(16, kind), axis=-1))
+            low, high = generator.bands[band]
+            peaks = freqs[np.argmax(spectrum, axis=-1)]
+            assert np.all((peaks >= low - 0.5) & (peaks <= high + 0.5))
+    
+    def test_generate_batch_noise_matches_profile(self):
+        generator = EEGSignalGenerator(seed=3)
+        batch = generator.generate_batch(32, 'normal')
+        single = np.stack([generator.generate_normal_eeg() for _ in range(32)])
+        assert batch.std() == pytest.approx(single.std(), rel=0.1)
+    
+    def test_batch_to_spectrograms(self):
+        generator = EEGSignalGenerator(duration=2, seed=4)
+        signals = generator.generate_batch(3, 'missing_alpha')
+        images = generator.batch_to_spectrograms(signals)
+        assert images.shape == (3, 256, 256) and images.dtype == np.uint8
+        np.testing.assert_array_equal(images[1], generator.signal_to_spectrogram(signals[1], raw=True))
+    
+    def test_generate_batch_rejects_unknown_kind(self):
+        with pytest.raises(ValueError):
+            self.generator.generate_batch(2, 'unknown')
+    
+    def test_stream_windows(self):
+        generator = EEGSignalGenerator(duration=2, seed=5)
+        windows = list(generator.stream(limit=70, abnormal_fraction=0.5, batch_size=16))
+        assert [w['index'] for w in windows] == list(range(70))
+        assert all(w['data'].shape == (512,) for w in windows)
+        assert {w['label'] for w in windows} == {'Normal', 'Abnormal'}
+        assert all((w['kind'] == 'normal') == (w['label'] == 'Normal') for w in windows)
+    
+    def test_stream_outputs(self):
+        generator = EEGSignalGenerator(duration=2, seed=6)
+        window = next(generator.stream(output='spectrogram', abnormal_fraction=0))
+        assert window['data'].shape == (256, 256) and window['label'] == 'Normal'
+        png = next(generator.stream(output='png'))['data']
+        assert png.startswith(b'\x89PNG')
+    
+    def test_stream_rate(self):
+        import time
+        generator = EEGSignalGenerator(duration=1, seed=7)
+        started = time.perf_counter()
+        list(generator.stream(rate=50, limit=6))
+        assert time.perf_counter() - started >= 0.1
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Unit tests for spectrogram arrays"""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+from scipy import signal
+
+from eeg_processor import EEGProcessor
+from signal_generator import ABNORMALITY_TYPES, EEGSignalGenerator
+from spectrogram import RAW_THRESHOLD, compute_spectrogram, resize_linear, spectrogram_to_image
+
+
+class TestSpectrogram:
+    def setup_method(self):
+        self.samples = np.random.default_rng(0).standard_normal(2560)
+
+    def test_compute_spectrogram_matches_scipy(self):
+        f, t, Sxx_db = compute_spectrogram(self.samples, fs=256)
+        f_ref, t_ref, Sxx = signal.spectrogram(self.samples, fs=256, window='hann', nperseg=128, noverlap=64)
+        mask = f_ref <= 50
+        np.testing.assert_array_equal(f, f_ref[mask])
+        np.testing.assert_array_equal(t, t_ref)
+        np.testing.assert_allclose(Sxx_db, 10 * np.log10(Sxx[mask] + 1e-10))
+
+    def test_image_is_normalized_uint8(self):
+        _, _, Sxx_db = compute_spectrogram(self.samples, fs=256)
+        image = spectrogram_to_image(Sxx_db)
+        assert image.shape == (256, 256)
+        assert image.dtype == np.uint8
+        assert image.min() < 32 and image.max() > 223
+
+    def test_low_frequencies_at_bottom(self):
+        Sxx_db = np.zeros((26, 39))
+        Sxx_db[0] = 10
+        image = spectrogram_to_image(Sxx_db, dtype=np.float64)
+        assert np.all(image[-1] == 255)
+        assert np.all(image[0] == 0)
+
+    def test_dynamic_range_ignores_deep_notches(self):
+        _, _, Sxx_db = compute_spectrogram(self.samples, fs=256)
+        notched = Sxx_db.copy()
+        notched[5, 5] -= 60
+        image = spectrogram_to_image(Sxx_db, dtype=np.float64)
+        changed = np.abs(spectrogram_to_image(notched, dtype=np.float64) - image) > 1e-9
+        assert changed.mean() < 0.01
+        # Min-max normalization lets the single notch rescale the whole image
+        minmax = spectrogram_to_image(Sxx_db, dtype=np.float64, dynamic_range=None)
+        notched_minmax = spectrogram_to_image(notched, dtype=np.float64, dynamic_range=None)
+        assert (np.abs(notched_minmax - minmax) > 1e-9).mean() > 0.5
+
+    def test_raw_threshold_separates_normal_from_abnormal(self):
+        generator = EEGSignalGenerator(seed=7)
+        processor = EEGProcessor(threshold=RAW_THRESHOLD)
+        processor.load_reference_images(generator.batch_to_spectrograms(generator.generate_batch(5, 'normal')))
+
+        def min_mse(kind):
+            images = generator.batch_to_spectrograms(generator.generate_batch(20, kind))
+            return np.array([r['min_mse'] for r in processor.classify_batch([i.astype(np.float64) for i in images])])
+
+        normal = min_mse('normal')
+        assert np.mean(normal <= RAW_THRESHOLD) >= 0.8
+        for kind in ABNORMALITY_TYPES:
+            abnormal = min_mse(kind)
+            assert np.mean(abnormal > RAW_THRESHOLD) >= 0.7, kind
+            assert np.median(normal) < RAW_THRESHOLD < np.median(abnormal), kind
+
+    def test_resize_linear_keeps_corners_and_constant(self):
+        array = np.arange(12, dtype=np.float64).reshape(3, 4)
+        resized = resize_linear(array, (7, 9))
+        assert resized.shape == (7, 9)
+        assert resized[0, 0] == array[0, 0] and resized[-1, -1] == array[-1, -1]
+        np.testing.assert_allclose(resize_linear(np.full((3, 4), 5.0), (8, 8)), 5.0)
+
+    def test_batch_matches_single(self):
+        signals = np.random.default_rng(1).standard_normal((3, 2560))
+        _, _, batch = compute_spectrogram(signals, fs=256)
+        images = spectrogram_to_image(batch)
+        for signal_row, image in zip(signals, images):
+            np.testing.assert_array_equal(image, spectrogram_to_image(compute_spectrogram(signal_row, fs=256)[2]))
+
+    def test_raw_dataset(self, tmp_path):
+        generator = EEGSignalGenerator(duration=2, seed=0)
+        generator.generate_dataset(str(tmp_path), reference_count=1, normal_count=1, abnormal_counts={}, raw=True)
+        image = Image.open(tmp_path / 'reference_signals' / 'eeg1n.png')
+        assert image.mode == 'L' and image.size == (256, 256)
+        assert len(os.listdir(tmp_path / 'test_samples')) == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
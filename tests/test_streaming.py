@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Unit tests for the streaming classifier"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from eeg_processor import EEGProcessor
+from signal_generator import EEGSignalGenerator
+from spectrogram import compute_spectrogram
+from streaming import StreamingClassifier
+
+
+class TestStreamingClassifier:
+    def setup_method(self):
+        self.generator = EEGSignalGenerator(duration=4, seed=21)
+        self.processor = EEGProcessor()
+        self.processor.load_reference_images(self.generator.batch_to_spectrograms(self.generator.generate_batch(3, 'normal')))
+        self.recording = np.concatenate(self.generator.generate_batch(3, 'normal'))
+
+    def push_in_chunks(self, classifier, samples, seed=0):
+        rng = np.random.default_rng(seed)
+        results = []
+        position = 0
+        while position < len(samples):
+            size = int(rng.integers(1, 300))
+            results += classifier.push(samples[position:position + size])
+            position += size
+        return results
+
+    def test_rolling_spectrogram_matches_scipy(self):
+        classifier = StreamingClassifier(self.processor, window_seconds=4)
+        pushed = self.recording[:1024 + 640]
+        self.push_in_chunks(classifier, pushed)
+
+        _, _, expected = compute_spectrogram(pushed[-1024:], fs=256)
+        assert classifier.ready
+        np.testing.assert_allclose(classifier.spectrogram, expected, atol=1e-8)
+
+    def test_one_decision_per_hop(self):
+        classifier = StreamingClassifier(self.processor, window_seconds=4)
+        results = self.push_in_chunks(classifier, self.recording)
+
+        ends = [r['sample_index'] for r in results]
+        assert ends[0] == 1024
+        assert np.all(np.diff(ends) == 64)
+        assert len(results) == (len(self.recording) - 1024) // 64 + 1
+        assert len(classifier.pending) < 128
+
+    def test_decisions_match_classify_signal(self):
+        classifier = StreamingClassifier(self.processor, window_seconds=4)
+        results = self.push_in_chunks(classifier, self.recording[:1024 + 256])
+
+        for result in results:
+            end = result['sample_index']
+            expected = self.processor.classify_signal(self.recording[end - 1024:end], fs=256)
+            assert result['min_mse'] == pytest.approx(expected['min_mse'])
+            assert result['classification'] == expected['classification']
+
+    def test_long_chunk_classified_in_bounded_groups(self):
+        classifier = StreamingClassifier(self.processor, window_seconds=2, batch_size=4)
+        reference = StreamingClassifier(self.processor, window_seconds=2)
+        with patch.object(self.processor, 'classify_batch', wraps=self.processor.classify_batch) as mock_batch:
+            results = classifier.push(self.recording)
+            assert max(len(call.args[0]) for call in mock_batch.call_args_list) <= 4
+            assert mock_batch.call_count == -(-len(results) // 4)
+
+        expected = self.push_in_chunks(reference, self.recording)
+        assert [r['sample_index'] for r in results] == [r['sample_index'] for r in expected]
+        assert [r['min_mse'] for r in results] == pytest.approx([r['min_mse'] for r in expected])
+
+    def test_window_shorter_than_segment(self):
+        with pytest.raises(ValueError):
+            StreamingClassifier(self.processor, window_seconds=0.25)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
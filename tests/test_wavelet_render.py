@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""Unit tests for Wavelet Panel Renderer module"""
+
+import pytest
+import io
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from wavelet_render import normalize_band, render_panels
+from eeg_processor import EEGProcessor
+
+class TestWaveletRender:
+    def setup_method(self):
+        self.processor = EEGProcessor()
+        self.image = np.random.rand(256, 256) * 255
+    
+    def test_normalize_band(self):
+        band = normalize_band(np.array([[-1.0, 0.0], [1.0, 3.0]]))
+        assert band.dtype == np.uint8
+        assert band.min() == 0 and band.max() == 255
+        assert not normalize_band(np.full((4, 4), 7.0)).any()
+    
+    def test_render_panels_layout(self):
+        panels = [(f'panel {i}', np.random.rand(32, 32)) for i in range(8)]
+        image = render_panels(panels, columns=4, tile_size=64, padding=4, label_height=10)
+        assert image.mode == 'L'
+        assert image.size == (4 * 68 + 4, 2 * 78 + 4)
+    
+    def test_fast_renderer_returns_png(self, tmp_path):
+        save_path = tmp_path / 'viz.png'
+        png = self.processor.visualize_wavelet_decomposition(None, str(save_path), image=self.image,
+                                                            renderer='fast')
+        assert png == save_path.read_bytes()
+        assert Image.open(io.BytesIO(png)).format == 'PNG'
+    
+    def test_fast_renderer_is_thread_safe(self):
+        def render(_):
+            return self.processor.visualize_wavelet_decomposition(None, image=self.image, renderer='fast')
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            outputs = list(executor.map(render, range(8)))
+        assert len(set(outputs)) == 1
+    
+    def test_unknown_renderer(self):
+        with pytest.raises(ValueError):
+            self.processor.visualize_wavelet_decomposition(None, image=self.image, renderer='svg')
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Wavelet Panel Renderer for Brain Mapping Project
+Tiles normalized wavelet bands into a single grayscale image with NumPy
+and PIL, as a fast, thread-safe alternative to matplotlib figures
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def normalize_band(band):
+    """
+    Scale a coefficient band to 0-255 like imshow with a gray colormap
+
+    Args:
+        band: 2D array of coefficients
+
+    Returns:
+        uint8 array of the same shape
+    """
+    band = np.asarray(band, dtype=np.float64)
+    low, high = band.min(), band.max()
+    if high <= low:
+        return np.zeros(band.shape, dtype=np.uint8)
+    return ((band - low) * (255.0 / (high - low))).round().astype(np.uint8)
+
+
+def render_panels(panels, columns=4, tile_size=256, padding=8, label_height=16):
+    """
+    Tile labelled 2D arrays into one grayscale image
+
+    Args:
+        panels: List of (title, 2D array) pairs in row-major order
+        columns: Number of panels per row
+        tile_size: Edge length each panel is scaled to
+        padding: Space between panels in pixels
+        label_height: Height reserved above each panel for its title
+
+    Returns:
+        PIL Image in mode 'L'
+    """
+    rows = -(-len(panels) // columns)
+    cell_w = tile_size + padding
+    cell_h = tile_size + label_height + padding
+    canvas = np.full((rows * cell_h + padding, columns * cell_w + padding), 255, dtype=np.uint8)
+
+    for i, (_, band) in enumerate(panels):
+        tile = Image.fromarray(normalize_band(band)).resize((tile_size, tile_size), Image.NEAREST)
+        top = (i // columns) * cell_h + padding + label_height
+        left = (i % columns) * cell_w + padding
+        canvas[top:top + tile_size, left:left + tile_size] = np.asarray(tile)
+
+    image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(image)
+    for i, (title, _) in enumerate(panels):
+        top = (i // columns) * cell_h + padding
+        left = (i % columns) * cell_w + padding
+        draw.text((left, top), title, fill=0)
+
+    return image
+
+
+def render_wavelet_decomposition(image, decomposition, layout, levels, save_path=None):
+    """
+    Render the eight wavelet decomposition panels without matplotlib
+
+    Args:
+        image: Original 2D image
+        decomposition: List of (cA, (cH, cV, cD)) per level, finest first,
+                       with at least three levels
+        layout: Full wavelet layout (w1)
+        levels: Number of levels in the layout, used in its title
+        save_path: Path to write the PNG to (optional)
+
+    Returns:
+        Encoded PNG bytes
+    """
+    cA1, (cH1, cV1, cD1) = decomposition[0]
+    panels = [
+        ('Original EEG Spectrogram', image),
+        ('Level 1 - Approximation (cA1)', cA1),
+        ('Level 1 - Horizontal (cH1)', cH1),
+        ('Level 1 - Vertical (cV1)', cV1),
+        ('Level 1 - Diagonal (cD1)', cD1),
+        ('Level 2 - Approximation (cA2)', decomposition[1][0]),
+        ('Level 3 - Approximation (cA3)', decomposition[2][0]),
+        (f'{levels}-Level Wavelet Transform', layout)
+    ]
+
+    buffer = io.BytesIO()
+    render_panels(panels).save(buffer, format='PNG')
+    png = buffer.getvalue()
+
+    if save_path:
+        with open(save_path, 'wb') as f:
+            f.write(png)
+
+    return png